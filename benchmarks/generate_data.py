@@ -0,0 +1,262 @@
+"""
+Seeded generator of synthetic data files with the same schema as the real ones.
+
+    python generate_data.py --lines 1m --skus 100k --out synthetic/1m-100k
+
+writes <out>/data/orders.csv, custom_orders.csv, inventory.csv, custom_inventory.csv,
+bought_together.csv, categories.csv and daily_orders.csv, plus <out>/meta.json with the parameters, and
+creates <out>/run, a working directory from which the scripts' ../data paths resolve to
+the synthetic files.
+
+The catalog has Zipf-distributed SKU popularity and category sizes; about a third of the
+SKUs are seasonal, with a peak month. Orders are spread over `days` days with a weekly
+cycle, a December peak and growth over time, have 1 + Poisson(1.4) lines and belong to
+Zipf-distributed users (5% are guest orders without UserID). The first line of an order
+is drawn by popularity in the order's month, each further line comes from the same
+category with probability SAME_CATEGORY_PROB, which gives bought_together.csv a real
+co-purchase structure.
+
+Orders are generated in chunks of whole orders, so memory depends on the chunk size and
+the number of SKUs. The derived files are built with the preprocess aggregates, exactly
+as the preprocess scripts would build them.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'preprocess'))
+
+from order_aggregates import prepare_orders, SkuStats, CategoryTotals, PairCounts, DailyTotals  # noqa: E402
+from derived_files import (  # noqa: E402
+    load_inventory, build_custom_inventory, build_bought_together, build_categories, build_daily_orders,
+)
+
+ORDER_COLUMNS = [
+    'OrderNumber', 'CreatedDate', 'UserID', 'SKU', 'Item title', 'Brand', 'Category',
+    'Quantity', 'OriginalUnitPrice', 'FinalUnitPrice', 'TotalOrderAmount',
+]
+
+ZIPF_EXPONENT = 1.07       # SKU popularity and user activity
+SEASONAL_SHARE = 0.35      # share of SKUs with a peak month
+SEASONAL_STRENGTH = 1.5    # peak month is about e^(2 * strength) times the weakest one
+MEAN_EXTRA_LINES = 1.4     # order lines after the first one (Poisson)
+SAME_CATEGORY_PROB = 0.5   # a further line comes from the category of the first one
+GUEST_SHARE = 0.05         # orders without UserID
+OUT_OF_STOCK_SHARE = 0.1   # inventory rows with Quantity 0 (dropped from custom_inventory.csv)
+
+
+def parse_count(text):
+    """
+    '10k' -> 10000, '2.5m' -> 2500000, '300' -> 300.
+    """
+    text = str(text).strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def _zipf_weights(n, rng):
+    weights = 1.0 / np.arange(1, n + 1) ** ZIPF_EXPONENT
+    return weights[rng.permutation(n)]
+
+
+class Catalog:
+    """
+    SKUs sorted by category, so category c owns the rows cat_start[c]:cat_start[c + 1].
+    """
+
+    def __init__(self, n_skus, rng):
+        n_categories = max(5, int(np.sqrt(n_skus) / 2))
+        n_brands = max(10, n_skus // 50)
+
+        category_weights = 1.0 / np.arange(1, n_categories + 1) ** ZIPF_EXPONENT
+        self.category = np.sort(rng.choice(n_categories, n_skus, p=category_weights / category_weights.sum()))
+        self.cat_start = np.searchsorted(self.category, np.arange(n_categories + 1))
+        self.category_names = np.array(
+            [f"Category {c // 10} / Subcategory {c}" for c in range(n_categories)], dtype=object
+        )
+
+        self.sku = np.array([f"9-{4896000000 + i}" for i in range(n_skus)], dtype=object)
+        brand = rng.integers(n_brands, size=n_skus)
+        self.brand = np.array([f"Brand {b}" for b in brand], dtype=object)
+        self.title = np.array([f"Brand {b} Product {i}" for i, b in enumerate(brand)], dtype=object)
+        self.price = np.round(np.clip(rng.lognormal(3.2, 0.8, n_skus), 1, 2000), 2)
+        self.discount_prob = rng.beta(2, 5, n_skus)
+
+        popularity = _zipf_weights(n_skus, rng)
+        self.popularity_cdf = np.cumsum(popularity)
+
+        # popularity by month: seasonal SKUs peak around their peak month
+        seasonal = rng.random(n_skus) < SEASONAL_SHARE
+        peak = rng.integers(12, size=n_skus)
+        months = np.arange(12)[:, None]
+        season = np.exp(SEASONAL_STRENGTH * np.cos(2 * np.pi * (months - peak) / 12))
+        season /= season.mean(axis=0)
+        season[:, ~seasonal] = 1.0
+        self.month_cdf = np.cumsum(popularity * season, axis=1)
+
+    def __len__(self):
+        return len(self.sku)
+
+    def sample_by_month(self, months, rng):
+        rows = np.empty(len(months), dtype=np.int64)
+        for m in np.unique(months):
+            at = np.flatnonzero(months == m)
+            cdf = self.month_cdf[m]
+            rows[at] = np.searchsorted(cdf, rng.random(len(at)) * cdf[-1], side='right')
+        return np.minimum(rows, len(self) - 1)
+
+    def sample_in_category(self, categories, rng):
+        cdf = self.popularity_cdf
+        start, end = self.cat_start[categories], self.cat_start[categories + 1]
+        low = np.where(start > 0, cdf[np.maximum(start - 1, 0)], 0.0)
+        high = cdf[end - 1]
+        rows = np.searchsorted(cdf, low + rng.random(len(categories)) * (high - low), side='right')
+        return np.clip(rows, start, end - 1)
+
+
+def _order_days(n_orders, days, rng):
+    day = np.arange(days)
+    dates = pd.date_range('2023-01-01', periods=days)
+    weights = (
+        np.where(dates.dayofweek >= 5, 1.2, 1.0)
+        * (1 + 0.3 * np.cos(2 * np.pi * (dates.dayofyear.to_numpy() - 350) / 365))
+        * (1 + 0.5 * day / days)
+    )
+    return np.sort(rng.choice(days, n_orders, p=weights / weights.sum()))
+
+
+def generate(out_dir, n_lines, n_skus, n_users=None, days=730, seed=42, chunk_lines=1_000_000):
+    """
+    Writes a synthetic data set to out_dir (see the module docstring) and returns its metadata.
+    """
+    rng = np.random.default_rng(seed)
+    data_dir = os.path.join(out_dir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(os.path.join(out_dir, 'run'), exist_ok=True)
+    n_users = n_users or max(100, n_lines // 25)
+
+    catalog = Catalog(n_skus, rng)
+
+    # Orders: sizes, days and users up front, lines chunk by chunk
+    n_orders = max(1, int(n_lines / (1 + MEAN_EXTRA_LINES)))
+    sizes = 1 + rng.poisson(MEAN_EXTRA_LINES, n_orders)
+    n_orders = int(np.searchsorted(np.cumsum(sizes), n_lines)) + 1
+    sizes = sizes[:n_orders]
+    sizes[-1] -= sizes.sum() - n_lines
+    sizes = sizes[sizes > 0]
+    n_orders = len(sizes)
+
+    start = np.datetime64('2023-01-01T00:00:00')
+    created = (
+        start
+        + _order_days(n_orders, days, rng).astype('timedelta64[D]')
+        + rng.integers(8 * 3600, 24 * 3600, n_orders).astype('timedelta64[s]')
+    )
+    created.sort()
+    order_month = pd.DatetimeIndex(created).month.to_numpy() - 1
+
+    user_activity = _zipf_weights(n_users, rng)
+    users = rng.choice(n_users, n_orders, p=user_activity / user_activity.sum()) + 10000
+    users = pd.array(users, dtype='Int64')
+    users[rng.random(n_orders) < GUEST_SHARE] = pd.NA
+
+    stock = np.where(rng.random(n_skus) < OUT_OF_STOCK_SHARE, 0, 1 + rng.poisson(20, n_skus)).astype(float)
+    ordered = np.zeros(n_skus, dtype=bool)
+
+    stats, category_totals, pair_counts = SkuStats(), CategoryTotals(), PairCounts(set(catalog.sku[stock >= 1]))
+    daily_totals = DailyTotals()
+    order_end = np.cumsum(sizes)
+    first_order = 0
+    while first_order < n_orders:
+        last_order = int(np.searchsorted(order_end, order_end[first_order] - sizes[first_order] + chunk_lines)) + 1
+        last_order = min(max(last_order, first_order + 1), n_orders)
+        orders = np.arange(first_order, last_order)
+        line_order = np.repeat(orders, sizes[orders])
+        is_first = np.r_[True, line_order[1:] != line_order[:-1]]
+
+        rows = catalog.sample_by_month(order_month[line_order], rng)
+        anchor = rows[np.maximum.accumulate(np.where(is_first, np.arange(len(rows)), 0))]
+        same_category = ~is_first & (rng.random(len(rows)) < SAME_CATEGORY_PROB)
+        rows[same_category] = catalog.sample_in_category(catalog.category[anchor[same_category]], rng)
+        ordered[rows] = True
+
+        quantity = 1 + rng.poisson(0.25, len(rows))
+        original = catalog.price[rows]
+        discounted = rng.random(len(rows)) < catalog.discount_prob[rows]
+        final = np.where(discounted, np.round(original * (1 - rng.uniform(0.05, 0.5, len(rows))), 2), original)
+        totals = np.bincount(line_order - first_order, weights=quantity * final)
+
+        chunk = pd.DataFrame({
+            'OrderNumber': line_order + 1,
+            'CreatedDate': pd.DatetimeIndex(created[line_order]).strftime('%Y-%m-%d %H:%M:%S'),
+            'UserID': users[line_order],
+            'SKU': catalog.sku[rows],
+            'Item title': catalog.title[rows],
+            'Brand': catalog.brand[rows],
+            'Category': catalog.category_names[catalog.category[rows]],
+            'Quantity': quantity,
+            'OriginalUnitPrice': original,
+            'FinalUnitPrice': final,
+            'TotalOrderAmount': np.round(totals[line_order - first_order], 2),
+        }, columns=ORDER_COLUMNS)
+
+        header = first_order == 0
+        mode = 'w' if header else 'a'
+        chunk.to_csv(os.path.join(data_dir, 'orders.csv'), index=False, mode=mode, header=header)
+        chunk = chunk.drop(columns=['Brand'])
+        chunk.to_csv(os.path.join(data_dir, 'custom_orders.csv'), index=False, mode=mode, header=header)
+
+        category_totals.update(chunk)
+        pair_counts.update(chunk)
+        chunk['CreatedDate'] = pd.to_datetime(chunk['CreatedDate'])
+        daily_totals.update(chunk)
+        stats.update(prepare_orders(chunk))
+        first_order = last_order
+
+    # Like in the real export, every inventory SKU has been ordered at least once
+    inventory = pd.DataFrame({'SKU': catalog.sku[ordered], 'Quantity': stock[ordered]})
+    inventory.to_csv(os.path.join(data_dir, 'inventory.csv'), index=False, float_format='%.2f')
+
+    # Derived files, as update_inventory.py / get_bought_together.py / get_categories.py /
+    # get_daily_orders.py write them
+    custom_inventory = build_custom_inventory(load_inventory(os.path.join(data_dir, 'inventory.csv')), stats)
+    custom_inventory.to_csv(os.path.join(data_dir, 'custom_inventory.csv'), index=False)
+    build_bought_together(pair_counts).to_csv(os.path.join(data_dir, 'bought_together.csv'), index=False)
+    build_categories(category_totals).to_csv(os.path.join(data_dir, 'categories.csv'), header=['TotalQuantity'])
+    build_daily_orders(daily_totals).to_csv(os.path.join(data_dir, 'daily_orders.csv'), index=False)
+
+    meta = {
+        'order_lines': int(n_lines), 'orders': int(n_orders), 'skus': int(n_skus), 'inventory_skus': int(ordered.sum()),
+        'users': int(n_users), 'days': int(days), 'seed': int(seed),
+    }
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic data files.")
+    parser.add_argument('--lines', default='100k', help="order lines, e.g. 10k, 1m")
+    parser.add_argument('--skus', default='10k', help="catalog size, e.g. 1k, 1m")
+    parser.add_argument('--users', default=None, help="number of users (default: lines / 25)")
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-lines', default='1m', help="order lines generated per chunk")
+    parser.add_argument('--out', required=True, help="output directory")
+    args = parser.parse_args()
+
+    meta = generate(
+        args.out, parse_count(args.lines), parse_count(args.skus),
+        n_users=parse_count(args.users) if args.users else None,
+        days=args.days, seed=args.seed, chunk_lines=parse_count(args.chunk_lines),
+    )
+    print(f"Wrote {meta['order_lines']} order lines ({meta['orders']} orders, {meta['skus']} SKUs) to {args.out}/data")
+
+
+if __name__ == "__main__":
+    main()
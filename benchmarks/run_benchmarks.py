@@ -0,0 +1,218 @@
+"""
+Scaling benchmarks on synthetic data (generate_data.py).
+
+    python run_benchmarks.py                                  # default sizes, every step
+    python run_benchmarks.py --sizes 10k:1k,1m:100k,10m:1m --steps complementary,update_inventory
+    python run_benchmarks.py --json results.json
+
+A size is ORDER_LINES:SKUS. Data sets are generated once under --data-root and reused.
+Every step runs in its own interpreter, from the data set's run directory, so the peak
+memory (max RSS) is the step's own and the scripts' ../data paths point to the synthetic
+files. The timed part of the src steps excludes reading the data files (the 'load' step
+times that) but includes building the derived lookups (graph, arrays, user index) they need.
+
+all_bundles and all_bundles_parallel run get_all_bundles without a user (no personalized
+bundles), the latter with one worker process per CPU (parallel_bundles.py), including
+starting the workers and sharing the tables with them.
+
+user_profile and personalized are timed without the Gemini call: the request returns no
+answer, so the fallback attributes are used. The preprocess steps rewrite the derived
+files of the data set, with the same content.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from generate_data import ROOT_DIR, generate, parse_count
+
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+PREPROCESS_DIR = os.path.join(ROOT_DIR, 'preprocess')
+
+DEFAULT_SIZES = '10k:1k,100k:10k,1m:100k'
+BUNDLE_DEPTH = 10
+EVAL_BUNDLES = 1000          # evaluate_bundle calls
+EVAL_BATCH_BUNDLES = 100000  # bundles in one bundle_eval.evaluate_bundles batch
+PROFILED_USERS = 50
+
+PREPROCESS_STEPS = ['update_orders', 'update_inventory', 'get_bought_together', 'get_categories', 'get_daily_orders']
+SRC_STEPS = [
+    'load', 'complementary', 'seasonal', 'thematic', 'cross-sell', 'personalized',
+    'evaluate_bundle', 'evaluate_batch', 'user_profile', 'all_user_profiles',
+    'all_bundles', 'all_bundles_parallel',
+]
+STEPS = SRC_STEPS + PREPROCESS_STEPS
+
+
+def peak_memory_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _sample_users(orders, n, seed=0):
+    users = orders['UserID'].dropna().unique()
+    rng = np.random.default_rng(seed)
+    return rng.choice(users, min(n, len(users)), replace=False).tolist()
+
+
+def _without_gemini():
+    import user_profiling
+    user_profiling.request_user_attributes_gemini = lambda prompt, timeout=None: None
+
+
+def run_src_step(step, meta):
+    """
+    Runs one src step in this process and returns (seconds, items).
+    """
+    sys.path.insert(0, SRC_DIR)
+    os.environ['GEMINI_CACHE'] = '0'
+    import data_store
+
+    start = time.perf_counter()
+    inventory, orders = data_store.get_inventory(), data_store.get_orders()
+    data_store.get_custom_orders()
+    data_store.get_bought_together()
+    if step == 'load':
+        return time.perf_counter() - start, meta['order_lines']
+
+    import bundle_eval
+    import suggest_bundles
+    import user_profiling
+    _without_gemini()
+    rng = np.random.default_rng(0)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        if step in ('complementary', 'seasonal', 'thematic', 'cross-sell'):
+            items = len(suggest_bundles.get_bundles(type=step, depth=BUNDLE_DEPTH))
+        elif step == 'personalized':
+            users = _sample_users(orders, 10)
+            start = time.perf_counter()
+            items = sum(len(suggest_bundles.get_bundles(type='personalized', userID=u)) for u in users)
+        elif step == 'evaluate_bundle':
+            skus = inventory['SKU'].unique()
+            bundles = rng.choice(skus, (EVAL_BUNDLES, 3)).tolist()
+            start = time.perf_counter()
+            for bundle in bundles:
+                suggest_bundles.evaluate_bundle(bundle)
+            items = len(bundles)
+        elif step == 'evaluate_batch':
+            idx = rng.integers(len(inventory), size=(EVAL_BATCH_BUNDLES, 3))
+            start = time.perf_counter()
+            bundle_eval.evaluate_bundles(idx)
+            items = len(idx)
+        elif step == 'user_profile':
+            users = _sample_users(orders, PROFILED_USERS)
+            start = time.perf_counter()
+            for userid in users:
+                user_profiling.get_user_profile(userid)
+            items = len(users)
+        elif step == 'all_user_profiles':
+            items = len(user_profiling.get_all_user_profiles())
+        elif step in ('all_bundles', 'all_bundles_parallel'):
+            workers = os.cpu_count() if step == 'all_bundles_parallel' else 0
+            start = time.perf_counter()
+            bundles, _ = suggest_bundles.get_all_bundles(depth=BUNDLE_DEPTH, workers=workers)
+            items = len(bundles)
+        else:
+            raise ValueError(f"Unknown step: {step}")
+        return time.perf_counter() - start, items
+
+
+def run_preprocess_step(step, meta):
+    import runpy
+    sys.path.insert(0, PREPROCESS_DIR)
+    sys.argv = [f'{step}.py']
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        runpy.run_path(os.path.join(PREPROCESS_DIR, f'{step}.py'), run_name='__main__')
+    return time.perf_counter() - start, meta['order_lines']
+
+
+def run_child(step, dataset_dir):
+    """
+    Entry point of the per-step interpreter: prints one JSON line with the measurements.
+    """
+    with open(os.path.join(dataset_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    os.chdir(os.path.join(dataset_dir, 'run'))
+    if step in PREPROCESS_STEPS:
+        seconds, items = run_preprocess_step(step, meta)
+    else:
+        seconds, items = run_src_step(step, meta)
+    print(json.dumps({'seconds': seconds, 'items': items, 'peak_mb': peak_memory_mb()}))
+
+
+def ensure_dataset(data_root, lines, skus, seed):
+    dataset_dir = os.path.join(data_root, f'{lines}-{skus}-{seed}')
+    if not os.path.exists(os.path.join(dataset_dir, 'meta.json')):
+        print(f"Generating {lines} order lines, {skus} SKUs...")
+        generate(dataset_dir, lines, skus, seed=seed)
+    return dataset_dir
+
+
+def measure(step, dataset_dir, timeout=None):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', step, '--dataset', dataset_dir],
+        capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return {'error': error[-1] if error else f"exit status {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma separated ORDER_LINES:SKUS sizes")
+    parser.add_argument('--steps', default=','.join(STEPS), help=f"comma separated steps out of: {', '.join(STEPS)}")
+    parser.add_argument('--data-root', default=os.path.join(ROOT_DIR, 'data', '.synthetic'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=None, help="seconds per step")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--dataset', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.dataset)
+        return
+
+    steps = args.steps.split(',')
+    unknown = set(steps) - set(STEPS)
+    if unknown:
+        parser.error(f"unknown steps: {', '.join(sorted(unknown))}")
+
+    results = []
+    print(f"{'lines':>10} {'skus':>9} {'step':<20} {'seconds':>9} {'items':>9} {'items/s':>11} {'peak MB':>9}")
+    for size in args.sizes.split(','):
+        lines, skus = (parse_count(part) for part in size.split(':'))
+        dataset_dir = ensure_dataset(args.data_root, lines, skus, args.seed)
+        for step in steps:
+            try:
+                row = measure(step, dataset_dir, args.timeout)
+            except subprocess.TimeoutExpired:
+                row = {'error': 'timeout'}
+            row.update({'order_lines': lines, 'skus': skus, 'step': step})
+            results.append(row)
+            if 'error' in row:
+                print(f"{lines:>10} {skus:>9} {step:<20} failed: {row['error']}")
+                continue
+            rate = row['items'] / row['seconds'] if row['seconds'] > 0 else float('inf')
+            print(f"{lines:>10} {skus:>9} {step:<20} {row['seconds']:>9.3f} {row['items']:>9} {rate:>11.1f} {row['peak_mb']:>9.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
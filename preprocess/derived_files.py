@@ -0,0 +1,142 @@
+"""
+Builders for the derived data files (custom_inventory.csv, bought_together.csv, categories.csv,
+daily_orders.csv) from the aggregates in order_aggregates.py. Used by the preprocess scripts
+and by the incremental update, so both produce the same files.
+"""
+import numpy as np
+import pandas as pd
+
+
+def load_inventory(path='../data/inventory.csv'):
+    """
+    Loads inventory.csv and adds the ProductCategory, ProductName and Margin columns if they are missing.
+    """
+    inventory_df = pd.read_csv(path, dtype={'SKU': str})
+
+    # Ensure relevant columns exist in inventory
+    if 'ProductCategory' not in inventory_df.columns:
+        inventory_df['ProductCategory'] = None
+
+    if 'ProductName' not in inventory_df.columns:
+        inventory_df['ProductName'] = None
+
+    if 'Margin' not in inventory_df.columns:
+        np.random.seed(42)
+        inventory_df['Margin'] = np.round(np.random.uniform(15, 45, size=len(inventory_df)), 2)
+
+    return inventory_df
+
+
+month_names = [
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december'
+]
+
+def season_runs(month_counts):
+    """
+    (start, length) of the season of every row of a SKU x 12 matrix of order lines per
+    month: the longest run of consecutive popular months (at least 1.5x the row's average),
+    which can wrap from December to January. start is 0-11 (January = 0), the first
+    longest run wins ties, and length is 0 when there is no popular month.
+    """
+    counts = np.asarray(month_counts, dtype=float)
+    # months without any order in the file don't count toward the average
+    n_months = max(int((counts.sum(axis=0) > 0).sum()), 1)
+    totals = counts.sum(axis=1)
+    threshold = (totals / n_months) * 1.5
+    popular = (counts >= threshold[:, None]) & (totals[:, None] > 0)
+
+    # two laps of the year, so runs through December continue into January
+    cyclic = np.hstack([popular, popular])
+    pos = np.arange(24)
+    last_gap = np.maximum.accumulate(np.where(cyclic, -1, pos), axis=1)
+    run_ends = cyclic & ~np.hstack([cyclic[:, 1:], np.zeros((len(cyclic), 1), dtype=bool)])
+    lengths = np.where(run_ends, pos - last_gap, 0)
+
+    end = lengths.argmax(axis=1)
+    length = lengths[np.arange(len(lengths)), end]
+    start = (end - length + 1) % 12
+    return start, length
+
+
+def season_masks(start, length):
+    """
+    12-bit masks of the seasons from season_runs (bit m-1 for month m), 0 for "all year".
+    """
+    in_season = (np.arange(12) - start[:, None]) % 12 < length[:, None]
+    return (in_season * (1 << np.arange(12))).sum(axis=1)
+
+
+def season_names(start, length):
+    """
+    Seasonality text of the seasons from season_runs: 'march', 'apr-aug' style ranges
+    ('december-february' when they wrap) or "all year".
+    """
+    names = np.array(month_names, dtype=object)
+    first, last = names[start], names[(start + length - 1) % 12]
+    return np.where(length == 0, "all year", np.where(length == 1, first, first + '-' + last))
+
+
+def build_custom_inventory(inventory_df, stats):
+    """
+    Merges the per-SKU statistics (order_aggregates.SkuStats) into the inventory.
+    """
+    # Base price (mean OriginalUnitPrice), average discount (only when discounted) and
+    # discounted vs full price order ratio per SKU
+    sku_stats = stats.summary()
+
+    # Product info from orders
+    sku_info = stats.sku_info
+    sku_info = sku_info.rename(columns={'Category': 'ProductCategory', 'Item title': 'ProductName'})
+
+    # Seasonality from the SKU x month order counts
+    start, length = season_runs(stats.month_counts)
+    sku_stats['Seasonality'] = season_names(start, length)
+    sku_stats['SeasonMask'] = season_masks(start, length)
+
+    # Merge all into inventory
+    updated_inventory = inventory_df.merge(sku_info, on='SKU', how='left', suffixes=('', '_orders'))
+    updated_inventory['ProductCategory'] = updated_inventory['ProductCategory_orders'].combine_first(updated_inventory['ProductCategory'])
+    updated_inventory['ProductName'] = updated_inventory['ProductName_orders'].combine_first(updated_inventory['ProductName'])
+    updated_inventory.drop(columns=['ProductCategory_orders', 'ProductName_orders'], inplace=True)
+
+    updated_inventory = updated_inventory.merge(sku_stats[[
+        'SKU', 'AverageDiscount', 'OrderCount_Ratio_Discounted_vs_FullPrice', 'Seasonality', 'SeasonMask', 'BasePrice'
+    ]], on='SKU', how='left')
+    updated_inventory['AverageDiscount'] = updated_inventory['AverageDiscount'].fillna(0)
+    updated_inventory['OrderCount_Ratio_Discounted_vs_FullPrice'] = updated_inventory['OrderCount_Ratio_Discounted_vs_FullPrice'].fillna(0)
+    updated_inventory['Seasonality'] = updated_inventory['Seasonality'].fillna('all year')
+    updated_inventory['SeasonMask'] = updated_inventory['SeasonMask'].fillna(0).astype(int)
+    updated_inventory['BasePrice'] = updated_inventory['BasePrice'].fillna(0)
+
+    # Round numeric columns to 2 decimals
+    numeric_cols = updated_inventory.select_dtypes(include=['float64', 'int64']).columns
+    updated_inventory[numeric_cols] = updated_inventory[numeric_cols].round(2)
+
+    # remove lines from inventory that have quantity < 1:
+    updated_inventory = updated_inventory[updated_inventory['Quantity'] >= 1]
+
+    return updated_inventory
+
+
+def build_bought_together(pair_counts, valid_skus=None, min_count=1):
+    """
+    ProductA,ProductB,Count rows from order_aggregates.PairCounts, sorted by count.
+    Only pairs of valid_skus are kept if it is given.
+    """
+    pair_df = pair_counts.pairs(min_count=min_count, valid_skus=valid_skus)
+    return pair_df.sort_values(by=['ProductA', 'ProductB']).sort_values(by='Count', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def build_categories(category_totals):
+    """
+    Quantity sold per category, largest first (order_aggregates.CategoryTotals).
+    """
+    return category_totals.summary()
+
+
+def build_daily_orders(daily_totals):
+    """
+    OrderDate,Orders,Revenue,DiscountedOrders,DiscountedShare,Items rows (order_aggregates.DailyTotals).
+    """
+    return daily_totals.summary()
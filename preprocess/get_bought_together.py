@@ -1,52 +1,48 @@
+import sys
 import pandas as pd
-from itertools import combinations
-from collections import Counter
 
-# Load order data
-df = pd.read_csv('../data/custom_orders.csv')
+from order_aggregates import read_chunk_size, iter_order_chunks, PairCounts
+from derived_files import build_bought_together
+import metrics
+import result_cache
 
-# Confirm required columns exist
-assert {'OrderNumber', 'SKU'}.issubset(df.columns), "Missing required columns"
-
-# Group SKUs by order number
-order_groups = df.groupby('OrderNumber')['SKU'].unique()
-
-# Count SKU pairs
-pair_counter = Counter()
-for skus in order_groups:
-    if len(skus) >= 2:
-        pairs = combinations(sorted(skus), 2)
-        pair_counter.update(pairs)
-
-# Convert pair counter to DataFrame
-pair_df = pd.DataFrame(
-    [(a, b, count) for (a, b), count in pair_counter.items()],
-    columns=['ProductA', 'ProductB', 'Count']
-)
+# Optional minimum number of co-purchases for a pair to be kept: python get_bought_together.py [min_count]
+MIN_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1
 
 # Load inventory and get valid SKUs
-inventory_df = pd.read_csv('../data/custom_inventory.csv')
+inventory_df = pd.read_csv('../data/custom_inventory.csv', dtype={'SKU': str})
 valid_skus = set(inventory_df['SKU'])
 
-# Filter out pairs where either SKU is not in inventory
-pair_df = pair_df[
-    pair_df['ProductA'].isin(valid_skus) & pair_df['ProductB'].isin(valid_skus)
-]
+# Count pairs of inventory SKUs with a sparse order x SKU matrix (X^T X), chunk by chunk
+# if ORDERS_CHUNK_SIZE is set. Pairs where either SKU is not in inventory are never counted.
+pair_counts = PairCounts(valid_skus)
+sku_to_name = {}
+for df in iter_order_chunks('../data/custom_orders.csv', read_chunk_size()):
+    # Confirm required columns exist
+    assert {'OrderNumber', 'SKU'}.issubset(df.columns), "Missing required columns"
 
-# Sort pairs by count
-pair_df = pair_df.sort_values(by='Count', ascending=False).reset_index(drop=True)
+    with metrics.span('preprocess.get_bought_together.count'):
+        pair_counts.update(df)
+
+    # Map SKU to product name
+    sku_name_map = df[['SKU', 'Item title']].drop_duplicates()
+    sku_to_name.update(zip(sku_name_map['SKU'], sku_name_map['Item title']))
+
+# Pairs sorted by count
+with metrics.span('preprocess.get_bought_together.build'):
+    pair_df = build_bought_together(pair_counts, min_count=MIN_COUNT)
 
 # Save results
-pair_df.to_csv('../data/bought_together.csv', index=False)
+with metrics.span('preprocess.get_bought_together.write'):
+    pair_df.to_csv('../data/bought_together.csv', index=False)
+# cached bundle results (result_cache.py in src) are stale now
+result_cache.invalidate()
+metrics.count('preprocess.get_bought_together.pairs', len(pair_df))
 print(pair_df.head(10))
 
 # Print with product names
 print("---------------------------------")
 
-# Map SKU to product name
-sku_name_map = df[['SKU', 'Item title']].drop_duplicates()
-sku_to_name = dict(zip(sku_name_map['SKU'], sku_name_map['Item title']))
-
 pair_df['ProductNameA'] = pair_df['ProductA'].map(sku_to_name)
 pair_df['ProductNameB'] = pair_df['ProductB'].map(sku_to_name)
 
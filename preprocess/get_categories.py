@@ -1,13 +1,15 @@
-import pandas as pd
+from order_aggregates import read_chunk_size, iter_order_chunks, CategoryTotals
+from derived_files import build_categories
+import metrics
 
-# Load your data (adjust path and separator if needed)
-df = pd.read_csv('../data/custom_orders.csv', sep=',')
+# Load your data (adjust path and separator if needed), in chunks if ORDERS_CHUNK_SIZE is set
+totals = CategoryTotals()
+for chunk in iter_order_chunks('../data/custom_orders.csv', read_chunk_size(), sep=','):
+    # Drop rows where Category or Quantity is missing, group by category and sum quantities
+    with metrics.span('preprocess.get_categories.aggregate'):
+        totals.update(chunk)
 
-# Drop rows where Category or Quantity is missing
-df = df.dropna(subset=['Category', 'Quantity'])
-
-# Group by category and sum quantities
-category_summary = df.groupby('Category')['Quantity'].sum().sort_values(ascending=False)
+category_summary = build_categories(totals)
 
 # Print results
 print("Product quantities sold per category:\n")
@@ -0,0 +1,23 @@
+from order_aggregates import read_chunk_size, iter_order_chunks, DailyTotals
+from derived_files import build_daily_orders
+import metrics
+import result_cache
+
+# Orders, revenue, discounted orders and items sold per day, read in chunks if ORDERS_CHUNK_SIZE is set.
+# suggest_bundles.py (orders per day) and revenue_forecast.py (daily revenue) read this table
+# instead of the whole order log.
+totals = DailyTotals()
+for chunk in iter_order_chunks('../data/orders.csv', read_chunk_size(), parse_dates=['CreatedDate']):
+    with metrics.span('preprocess.get_daily_orders.aggregate'):
+        totals.update(chunk)
+
+daily_orders = build_daily_orders(totals)
+
+# Save
+with metrics.span('preprocess.get_daily_orders.write'):
+    daily_orders.to_csv('../data/daily_orders.csv', index=False)
+metrics.count('preprocess.get_daily_orders.days', len(daily_orders))
+# cached bundle results (result_cache.py in src) are stale now
+result_cache.invalidate()
+
+print(f"Saved daily_orders.csv ({len(daily_orders)} days, {daily_orders['Orders'].sum()} orders)")
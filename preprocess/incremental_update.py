@@ -0,0 +1,210 @@
+"""
+Incremental refresh of the derived data files when new orders arrive.
+
+    python incremental_update.py --rebuild          # build the state from all of ../data/orders.csv
+    python incremental_update.py new_orders.csv     # fold in only the new orders
+
+The state file keeps the aggregates of every order folded in so far: first-seen
+category/name per SKU, per-SKU price and discount sums, discounted/full-price order
+counts, SKU x month counts, pair counts, category totals and daily order totals. Folding
+a delta updates them and regenerates custom_inventory.csv, bought_together.csv,
+categories.csv and daily_orders.csv, so the work grows with the size of the delta and
+the number of SKUs, not with the full order history.
+
+The new orders file has the orders.csv format and must contain whole orders that are
+not in orders.csv yet. Its rows are appended to orders.csv, and to custom_orders.csv
+with the categories and names resolved like update_orders.py does. If a run stops
+half-way, the next run cuts the orders files back to where they were before it, so the
+delta can simply be applied again.
+Set ORDERS_CHUNK_SIZE to read the input in chunks.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sys
+
+import pandas as pd
+
+from order_aggregates import (
+    read_chunk_size, iter_order_chunks, prepare_orders, normalize_orders,
+    FirstSeen, SkuStats, CategoryTotals, PairCounts, DailyTotals,
+)
+from derived_files import (
+    load_inventory, build_custom_inventory, build_bought_together, build_categories, build_daily_orders,
+)
+import metrics
+import result_cache
+
+ORDERS_PATH = '../data/orders.csv'
+CUSTOM_ORDERS_PATH = '../data/custom_orders.csv'
+STATE_PATH = '../data/order_state.pkl'
+PENDING_PATH = '../data/order_state.pending'  # written while a delta is being applied
+STATE_VERSION = 3  # bumped when the layout of the aggregates changes
+
+
+class OrderState:
+    """
+    All the aggregates behind the derived data files.
+    """
+
+    def __init__(self):
+        self.first_seen = FirstSeen(['Category', 'Item title'])
+        self.sku_stats = SkuStats()
+        self.category_totals = CategoryTotals()
+        self.pair_counts = PairCounts()
+        self.daily_totals = DailyTotals()
+        self.applied = set()  # hashes of the delta files folded in
+        self.version = STATE_VERSION
+
+    @metrics.timed('preprocess.incremental_update.fold')
+    def fold(self, path, write_mode):
+        """
+        Folds the orders in path into the state and writes them to custom_orders.csv
+        (write_mode 'w' rewrites it, 'a' appends).
+        """
+        chunk_size = read_chunk_size()
+
+        # First pass: categories and names of SKUs not seen before
+        for chunk in iter_order_chunks(path, chunk_size):
+            self.first_seen.update(chunk)
+
+        # Second pass: normalize, save and aggregate
+        for i, chunk in enumerate(iter_order_chunks(path, chunk_size)):
+            chunk = normalize_orders(chunk, self.first_seen)
+            header = write_mode == 'w' and i == 0
+            chunk.to_csv(CUSTOM_ORDERS_PATH, index=False, mode='w' if header else 'a', header=header)
+
+            self.category_totals.update(chunk)
+            self.pair_counts.update(chunk)
+
+            chunk = chunk.copy()
+            chunk['CreatedDate'] = pd.to_datetime(chunk['CreatedDate'])
+            self.daily_totals.update(chunk)
+            self.sku_stats.update(prepare_orders(chunk))
+
+    @metrics.timed('preprocess.incremental_update.write_derived_files')
+    def write_derived_files(self):
+        updated_inventory = build_custom_inventory(load_inventory(), self.sku_stats)
+        updated_inventory.to_csv('../data/custom_inventory.csv', index=False)
+
+        pair_df = build_bought_together(self.pair_counts, valid_skus=set(updated_inventory['SKU']))
+        pair_df.to_csv('../data/bought_together.csv', index=False)
+
+        category_summary = build_categories(self.category_totals)
+        category_summary.to_csv('../data/categories.csv', header=['TotalQuantity'])
+
+        daily_orders = build_daily_orders(self.daily_totals)
+        daily_orders.to_csv('../data/daily_orders.csv', index=False)
+        result_cache.invalidate()
+
+        print(f"Saved custom_inventory.csv ({len(updated_inventory)} SKUs), "
+              f"bought_together.csv ({len(pair_df)} pairs), categories.csv ({len(category_summary)} categories), "
+              f"daily_orders.csv ({len(daily_orders)} days)")
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        raise FileNotFoundError(f"No state at {STATE_PATH}, run `python incremental_update.py --rebuild` first.")
+    with open(STATE_PATH, 'rb') as f:
+        state = pickle.load(f)
+    if getattr(state, 'version', 1) != STATE_VERSION:
+        raise ValueError(f"The state at {STATE_PATH} has an older format, run `python incremental_update.py --rebuild`.")
+    return state
+
+
+def save_state(state):
+    tmp_path = STATE_PATH + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def begin_delta(delta_hash):
+    """
+    Records the sizes of the orders files before the delta is appended to them.
+    """
+    pending = {'delta': delta_hash, 'sizes': {path: os.path.getsize(path) for path in (ORDERS_PATH, CUSTOM_ORDERS_PATH)}}
+    tmp_path = PENDING_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(pending, f)
+    os.replace(tmp_path, PENDING_PATH)
+
+
+def recover():
+    """
+    Undoes the appends of a delta that did not finish: its hash is not in the saved state,
+    so the orders files are cut back to their sizes before it.
+    """
+    if not os.path.exists(PENDING_PATH):
+        return
+    with open(PENDING_PATH) as f:
+        pending = json.load(f)
+    applied = set()
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, 'rb') as f:
+            applied = getattr(pickle.load(f), 'applied', set())
+    if pending['delta'] not in applied:
+        for path, size in pending['sizes'].items():
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+        print("Removed the orders of an unfinished update from the orders files.")
+    os.remove(PENDING_PATH)
+
+
+def rebuild():
+    """
+    Builds the state from all of orders.csv and rewrites every derived file.
+    """
+    recover()
+    state = OrderState()
+    state.fold(ORDERS_PATH, write_mode='w')
+    state.write_derived_files()
+    save_state(state)
+    print(f"State rebuilt from {ORDERS_PATH}")
+
+
+def apply_delta(path):
+    """
+    Folds the orders in path into the saved state and refreshes the derived files.
+    """
+    recover()
+    state = load_state()
+    delta_hash = file_hash(path)
+    if delta_hash in state.applied:
+        print(f"{path} was already applied, nothing to do.")
+        return
+
+    # From here until the state is saved, a failure leaves the appends to be undone by recover()
+    begin_delta(delta_hash)
+
+    # Append the raw orders to orders.csv, in its column order
+    columns = pd.read_csv(ORDERS_PATH, nrows=0).columns
+    for chunk in iter_order_chunks(path, read_chunk_size()):
+        chunk.reindex(columns=columns).to_csv(ORDERS_PATH, index=False, mode='a', header=False)
+
+    state.fold(path, write_mode='a')
+    state.applied.add(delta_hash)
+    state.write_derived_files()
+    save_state(state)
+    os.remove(PENDING_PATH)
+    print(f"Applied {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+
+    if sys.argv[1] == '--rebuild':
+        rebuild()
+    else:
+        apply_delta(sys.argv[1])
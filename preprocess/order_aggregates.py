@@ -0,0 +1,367 @@
+"""
+Chunked reading of the orders files and mergeable per-chunk aggregates,
+shared by the preprocess scripts.
+
+Set ORDERS_CHUNK_SIZE (rows) to stream the orders file instead of loading it
+whole, e.g. `ORDERS_CHUNK_SIZE=500000 python update_inventory.py`. Every
+aggregate below is built from partial results that are merged chunk by chunk, so
+both modes write the same files and peak memory depends on the chunk size and the
+number of distinct SKUs, not on the size of the orders file.
+
+Chunks are aligned to order boundaries: the rows of the last order in a chunk are
+carried over to the next one. This assumes the rows of an order are contiguous in the
+file, which is how the order export writes them.
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# metrics.py lives in src; the preprocess scripts import it after this module
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import metrics  # noqa: E402
+
+
+# SKUs are kept as text: a chunk where every SKU looks numeric would otherwise be read as ints
+ORDER_DTYPES = {'SKU': str}
+
+
+def read_chunk_size():
+    """
+    Chunk size from the ORDERS_CHUNK_SIZE environment variable, None (no streaming) if unset or 0.
+    """
+    value = int(os.getenv("ORDERS_CHUNK_SIZE", "0") or 0)
+    return value if value > 0 else None
+
+
+def iter_order_chunks(path, chunksize=None, **read_csv_kwargs):
+    """
+    Yields the orders file as DataFrames of about chunksize rows that never split an order.
+    With chunksize=None the whole file is yielded as one DataFrame.
+    """
+    read_csv_kwargs['dtype'] = {**ORDER_DTYPES, **read_csv_kwargs.get('dtype', {})}
+    if not chunksize:
+        with metrics.span('preprocess.read'):
+            df = pd.read_csv(path, **read_csv_kwargs)
+        metrics.count('preprocess.rows_read', len(df))
+        yield df
+        return
+
+    carry = None
+    for chunk in pd.read_csv(path, chunksize=chunksize, **read_csv_kwargs):
+        metrics.count('preprocess.rows_read', len(chunk))
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        order_numbers = chunk['OrderNumber'].to_numpy()
+        other_rows = np.flatnonzero(order_numbers != order_numbers[-1])
+        split = other_rows[-1] + 1 if len(other_rows) else 0
+
+        carry = chunk.iloc[split:]
+        if split:
+            yield chunk.iloc[:split]
+
+    if carry is not None and len(carry):
+        yield carry
+
+
+def _add(total, part):
+    """
+    Adds two partial aggregates (Series or DataFrames indexed by key).
+    """
+    if total is None:
+        return part
+    return total.add(part, fill_value=0)
+
+
+def _append_unique(total, part):
+    """
+    Appends rows and keeps the first occurrence of each one (NaN counts as a value).
+    """
+    if total is None:
+        return part.drop_duplicates().reset_index(drop=True)
+    return pd.concat([total, part], ignore_index=True).drop_duplicates().reset_index(drop=True)
+
+
+def _add_rows(array, n):
+    """
+    array with n rows of zeros appended.
+    """
+    return np.vstack([array, np.zeros((n, array.shape[1]), dtype=array.dtype)])
+
+
+def prepare_orders(chunk):
+    """
+    Drops rows without SKU or CreatedDate and adds the discount columns used by the inventory stats.
+    """
+    chunk = chunk.dropna(subset=['SKU', 'CreatedDate']).copy()
+    chunk['DiscountAmount'] = (chunk['OriginalUnitPrice'] - chunk['FinalUnitPrice']).clip(lower=0)
+    chunk['HasDiscount'] = chunk['DiscountAmount'] > 0
+    chunk['Month'] = chunk['CreatedDate'].dt.month
+    return chunk
+
+
+class FirstSeen:
+    """
+    First-seen value of some columns per SKU, plus every distinct value (update_orders.py).
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.values = {col: None for col in columns}  # col -> DataFrame of distinct (SKU, value) pairs
+        self.float_columns = set()
+        self._first = {}
+
+    def update(self, chunk):
+        self._first = {}
+        for col in self.columns:
+            pairs = chunk.loc[chunk['SKU'].notna(), ['SKU', col]]
+            self.values[col] = _append_unique(self.values[col], pairs)
+        # columns that are float in any chunk are float in the whole file
+        self.float_columns.update(c for c in chunk.columns if pd.api.types.is_float_dtype(chunk[c]))
+
+    def distinct(self, col):
+        """
+        SKU -> array of distinct values in order of appearance.
+        """
+        return self.values[col].groupby('SKU')[col].unique()
+
+    def first(self, col):
+        """
+        SKU -> first value seen.
+        """
+        if col not in self._first:
+            self._first[col] = self.distinct(col).apply(lambda values: values[0])
+        return self._first[col]
+
+
+def normalize_orders(chunk, first_seen):
+    """
+    Drops the Brand column and gives every SKU its first-seen category and name (update_orders.py).
+    """
+    # Drop Brand column if it exists
+    if 'Brand' in chunk.columns:
+        chunk = chunk.drop(columns=['Brand'])
+
+    chunk['Category'] = chunk['SKU'].map(first_seen.first('Category'))
+    chunk['Item title'] = chunk['SKU'].map(first_seen.first('Item title'))
+
+    # keep number formatting identical to a single-pass write
+    for col in first_seen.float_columns & set(chunk.columns):
+        if pd.api.types.is_numeric_dtype(chunk[col]) and not pd.api.types.is_float_dtype(chunk[col]):
+            chunk[col] = chunk[col].astype(float)
+
+    return chunk
+
+
+class SkuStats:
+    """
+    Per-SKU statistics behind custom_inventory.csv (update_inventory.py).
+    Expects chunks passed through prepare_orders.
+
+    Each chunk is aggregated in one pass: its SKUs are turned into row numbers once and
+    every statistic is a bincount (or, for the price sums, a groupby sum) over them, added
+    to arrays with one row per SKU seen.
+    """
+
+    def __init__(self):
+        self.skus = pd.Index([], dtype=object)
+        self.price = np.zeros((0, 2))                          # [sum, count] of OriginalUnitPrice
+        self.discount = np.zeros((0, 2))                       # [sum, count] of DiscountAmount on discounted rows
+        self.order_counts = np.zeros((0, 2), dtype=np.int64)   # distinct orders [full price, discounted]
+        self.month_counts = np.zeros((0, 12), dtype=np.int64)  # order lines per month
+        self.sku_info = None                                   # distinct (SKU, Category, Item title)
+
+    def _codes(self, skus):
+        """
+        Row of every SKU in skus, adding rows for the SKUs not seen before.
+        """
+        new_skus = pd.Index(pd.unique(skus)).difference(self.skus, sort=False)
+        if len(new_skus):
+            self.skus = self.skus.append(new_skus)
+            self.price, self.discount = _add_rows(self.price, len(new_skus)), _add_rows(self.discount, len(new_skus))
+            self.order_counts = _add_rows(self.order_counts, len(new_skus))
+            self.month_counts = _add_rows(self.month_counts, len(new_skus))
+        return self.skus.get_indexer(skus)
+
+    def update(self, chunk):
+        codes = self._codes(chunk['SKU'])
+        n = len(self.skus)
+
+        def per_sku(rows, weights=None):
+            return np.bincount(codes[rows], weights=None if weights is None else weights[rows], minlength=n)
+
+        def per_sku_sum(rows, values):
+            # pandas' compensated sum, so the means round like the single-pass groupby mean did
+            sums = pd.Series(values[rows]).groupby(codes[rows]).sum()
+            out = np.zeros(n)
+            out[sums.index.to_numpy()] = sums.to_numpy()
+            return out
+
+        price = chunk['OriginalUnitPrice'].to_numpy(dtype=float)
+        priced = ~np.isnan(price)
+        self.price += np.column_stack([per_sku_sum(priced, price), per_sku(priced)])
+
+        discounted = chunk['HasDiscount'].to_numpy(dtype=bool)
+        amount = chunk['DiscountAmount'].to_numpy(dtype=float)
+        self.discount += np.column_stack([per_sku_sum(discounted, amount), per_sku(discounted)])
+
+        months = chunk['Month'].to_numpy(dtype=np.int64) - 1
+        self.month_counts += np.bincount(codes * 12 + months, minlength=n * 12).reshape(n, 12)
+
+        # distinct (SKU, HasDiscount, OrderNumber) triples; chunks never split an order,
+        # so distinct orders per chunk add up
+        orders = chunk['OrderNumber']
+        has_order = orders.notna().to_numpy()
+        order_codes, order_numbers = pd.factorize(orders[has_order])
+        groups = codes[has_order] * 2 + discounted[has_order]
+        triples = np.unique(groups * max(len(order_numbers), 1) + order_codes)
+        self.order_counts += np.bincount(triples // max(len(order_numbers), 1), minlength=n * 2).reshape(n, 2)
+
+        self.sku_info = _append_unique(self.sku_info, chunk[['SKU', 'Category', 'Item title']])
+
+    def summary(self):
+        """
+        One row per SKU: BasePrice, AverageDiscount (NaN if never discounted) and
+        OrderCount_Ratio_Discounted_vs_FullPrice (inf without full-price orders, NaN without orders).
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            base_price = np.where(self.price[:, 1] > 0, self.price[:, 0] / self.price[:, 1], np.nan)
+            avg_discount = np.where(self.discount[:, 1] > 0, self.discount[:, 0] / self.discount[:, 1], np.nan)
+            full_price, discounted = self.order_counts[:, 0], self.order_counts[:, 1]
+            ratio = np.where(full_price > 0, discounted / full_price, np.inf)
+        ratio[self.order_counts.sum(axis=1) == 0] = np.nan
+        return pd.DataFrame({
+            'SKU': np.asarray(self.skus, dtype=object),
+            'BasePrice': base_price,
+            'AverageDiscount': avg_discount,
+            'OrderCount_Ratio_Discounted_vs_FullPrice': ratio,
+        })
+
+
+class CategoryTotals:
+    """
+    Quantity sold per category (get_categories.py).
+    """
+
+    def __init__(self):
+        self.totals = None
+        self.float_quantity = False
+
+    def update(self, chunk):
+        chunk = chunk.dropna(subset=['Category', 'Quantity'])
+        self.float_quantity |= pd.api.types.is_float_dtype(chunk['Quantity'])
+        self.totals = _add(self.totals, chunk.groupby('Category')['Quantity'].sum())
+
+    def summary(self):
+        totals = self.totals if self.totals is not None else pd.Series(dtype=float, name='Quantity')
+        # adding the chunks with fill_value turns integer totals into floats
+        totals = totals.astype(float if self.float_quantity else np.int64)
+        return totals.sort_values(ascending=False)
+
+
+class DailyTotals:
+    """
+    Orders, revenue, discounted orders and items sold per day (get_daily_orders.py).
+    Expects chunks with CreatedDate parsed as datetimes.
+    """
+
+    def __init__(self):
+        self.totals = None  # OrderDate -> Orders, Revenue, DiscountedOrders, Items
+        self.float_quantity = False
+
+    def update(self, chunk):
+        chunk = chunk.assign(
+            OrderDate=chunk['CreatedDate'].dt.normalize(),
+            Discounted=chunk['OriginalUnitPrice'] > chunk['FinalUnitPrice'],
+        ).dropna(subset=['OrderDate'])
+        self.float_quantity |= pd.api.types.is_float_dtype(chunk['Quantity'])
+
+        # an order counts on every day it has rows, its amount on the day of its first row;
+        # chunks never split an order, so both add up
+        orders = chunk.dropna(subset=['OrderNumber']).groupby(['OrderDate', 'OrderNumber'])['Discounted'].any()
+        per_day = orders.groupby(level='OrderDate').agg(['size', 'sum'])
+        revenue = chunk.drop_duplicates(subset=['OrderNumber']).groupby('OrderDate')['TotalOrderAmount'].sum()
+
+        part = pd.DataFrame({
+            'Orders': per_day['size'],
+            'Revenue': revenue,
+            'DiscountedOrders': per_day['sum'],
+            'Items': chunk.groupby('OrderDate')['Quantity'].sum(),
+        }).fillna(0)
+        self.totals = _add(self.totals, part)
+
+    def summary(self):
+        """
+        One row per day with orders, oldest first, with the share of discounted orders
+        and the revenue rounded to cents.
+        """
+        columns = ['Orders', 'Revenue', 'DiscountedOrders', 'Items']
+        totals = self.totals if self.totals is not None else pd.DataFrame(columns=columns, dtype=float)
+        daily = totals.sort_index().rename_axis('OrderDate').reset_index()
+        daily['Orders'] = daily['Orders'].astype(np.int64)
+        daily['DiscountedOrders'] = daily['DiscountedOrders'].astype(np.int64)
+        # amounts are in cents; rounding drops the summation-order noise of chunked and incremental runs
+        daily['Revenue'] = daily['Revenue'].round(2)
+        if not self.float_quantity:
+            daily['Items'] = daily['Items'].astype(np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily['DiscountedShare'] = np.where(daily['Orders'] > 0, daily['DiscountedOrders'] / daily['Orders'], 0.0)
+        return daily[['OrderDate', 'Orders', 'Revenue', 'DiscountedOrders', 'DiscountedShare', 'Items']]
+
+
+class PairCounts:
+    """
+    Co-purchase counts (get_bought_together.py) as a sparse upper-triangular SKU x SKU matrix.
+
+    With valid_skus the matrix covers only those SKUs and everything else is ignored.
+    Without it, every SKU seen is added as it shows up, which the incremental update
+    needs because new SKUs arrive with new orders.
+    """
+
+    def __init__(self, valid_skus=None):
+        self.fixed = valid_skus is not None
+        self.skus = pd.Index(sorted(valid_skus) if self.fixed else [], dtype=object)
+        self.counts = sparse.csr_matrix((len(self.skus), len(self.skus)), dtype=np.int64)
+
+    def _add_skus(self, skus):
+        new_skus = pd.Index(pd.unique(skus)).difference(self.skus, sort=False)
+        if len(new_skus):
+            self.skus = self.skus.append(new_skus)
+            self.counts.resize((len(self.skus), len(self.skus)))
+
+    def update(self, chunk):
+        if self.fixed:
+            baskets = chunk.loc[chunk['SKU'].isin(self.skus), ['OrderNumber', 'SKU']]
+        else:
+            baskets = chunk.loc[chunk['SKU'].notna(), ['OrderNumber', 'SKU']]
+            self._add_skus(baskets['SKU'])
+        baskets = baskets.drop_duplicates()
+        if baskets.empty:
+            return
+
+        order_codes, orders = pd.factorize(baskets['OrderNumber'])
+        sku_codes = self.skus.get_indexer(baskets['SKU'])
+        X = sparse.csr_matrix(
+            (np.ones(len(baskets), dtype=np.int64), (order_codes, sku_codes)),
+            shape=(len(orders), len(self.skus))
+        )
+        # (X^T X)[a, b] is the number of orders containing both a and b
+        self.counts = self.counts + sparse.triu(X.T @ X, k=1).tocsr()
+
+    def pairs(self, min_count=1, valid_skus=None):
+        """
+        ProductA,ProductB,Count rows with ProductA < ProductB.
+        """
+        co_counts = self.counts.tocoo()
+        keep = co_counts.data >= min_count
+        skus = np.asarray(self.skus, dtype=object)
+        a, b = skus[co_counts.row[keep]], skus[co_counts.col[keep]]
+        swap = a > b
+        a[swap], b[swap] = b[swap], a[swap]
+
+        pair_df = pd.DataFrame({'ProductA': a, 'ProductB': b, 'Count': co_counts.data[keep].astype(np.int64)})
+        if valid_skus is not None:
+            pair_df = pair_df[pair_df['ProductA'].isin(valid_skus) & pair_df['ProductB'].isin(valid_skus)]
+        return pair_df.reset_index(drop=True)
@@ -1,15 +1,30 @@
-import pandas as pd
+from order_aggregates import read_chunk_size, iter_order_chunks, FirstSeen, normalize_orders
+import metrics
+import result_cache
+
+ORDERS_PATH = '../data/orders.csv'
+OUTPUT_PATH = '../data/custom_orders.csv'
+
+# Load orders data (whole file, or in chunks if ORDERS_CHUNK_SIZE is set)
+chunk_size = read_chunk_size()
+if chunk_size:
+    def order_chunks():
+        return iter_order_chunks(ORDERS_PATH, chunk_size)
+else:
+    orders_df = next(iter_order_chunks(ORDERS_PATH))
 
-# Load orders data
-orders_df = pd.read_csv('../data/orders.csv')
+    def order_chunks():
+        return [orders_df]
 
-# Drop Brand column if it exists
-if 'Brand' in orders_df.columns:
-    orders_df = orders_df.drop(columns=['Brand'])
+# First pass: collect the categories and names seen for every SKU
+first_seen = FirstSeen(['Category', 'Item title'])
+for chunk in order_chunks():
+    with metrics.span('preprocess.update_orders.first_seen'):
+        first_seen.update(chunk)
 
 # === Step 1: Resolve multiple categories per SKU ===
 # Find SKUs with multiple categories
-sku_categories = orders_df.groupby('SKU')['Category'].unique()
+sku_categories = first_seen.distinct('Category')
 multi_cat_skus = sku_categories[sku_categories.apply(len) > 1]
 
 if not multi_cat_skus.empty:
@@ -19,13 +34,9 @@ if not multi_cat_skus.empty:
 else:
     print("No SKUs with multiple categories found.")
 
-# Map each SKU to its first category
-sku_to_category = sku_categories.apply(lambda cats: cats[0])
-orders_df['Category'] = orders_df['SKU'].map(sku_to_category)
-
 # === Step 2: Resolve multiple names per SKU ===
 # Find SKUs with multiple product names
-sku_names = orders_df.groupby('SKU')['Item title'].unique()
+sku_names = first_seen.distinct('Item title')
 multi_name_skus = sku_names[sku_names.apply(len) > 1]
 
 if not multi_name_skus.empty:
@@ -35,11 +46,17 @@ if not multi_name_skus.empty:
 else:
     print("No SKUs with multiple product names found.")
 
-# Map each SKU to its first name
-sku_to_name = sku_names.apply(lambda names: names[0])
-orders_df['Item title'] = orders_df['SKU'].map(sku_to_name)
+# Second pass: rewrite the orders with one category and name per SKU
+for i, chunk in enumerate(order_chunks()):
+    # Drop Brand and map each SKU to its first category and first name
+    with metrics.span('preprocess.update_orders.normalize'):
+        chunk = normalize_orders(chunk, first_seen)
 
-# Save the cleaned orders
-orders_df.to_csv('../data/custom_orders.csv', index=False)
+    # Save the cleaned orders
+    with metrics.span('preprocess.update_orders.write'):
+        chunk.to_csv(OUTPUT_PATH, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+    metrics.count('preprocess.update_orders.rows_written', len(chunk))
 
+# cached bundle results (result_cache.py in src) are stale now
+result_cache.invalidate()
 print("\nUpdated orders saved to custom_orders.csv")
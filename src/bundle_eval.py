@@ -0,0 +1,423 @@
+"""
+Batch bundle evaluation over SKU-indexed NumPy arrays.
+
+A batch of N bundles is an (N, 3) integer array of row indices into
+custom_inventory.csv. 2-product bundles are padded with PAD in the last column.
+All money math is the same as evaluate_bundle / calculate_bundle_discount_flexible_percent
+in suggest_bundles.py, done for the whole batch at once.
+"""
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import data_store
+
+PAD = -1
+CONVERSION_RATE = 0.1  # rate at which we expect to sell the bundle
+DESIRED_MARGIN = 0.1   # the maximum discount still leaves us this profit margin
+
+
+def _build_arrays(inventory_df):
+    ratio = inventory_df['OrderCount_Ratio_Discounted_vs_FullPrice'].to_numpy(dtype=float).copy()
+    ratio[np.isinf(ratio)] = 9999999
+
+    names = inventory_df['ProductName'].tolist()
+    skus = inventory_df['SKU'].tolist()
+    name_counts = inventory_df['ProductName'].value_counts()
+
+    return {
+        "sku": np.array(skus, dtype=object),
+        "name": np.array(names, dtype=object),
+        "price": inventory_df['BasePrice'].to_numpy(dtype=float),
+        "margin": inventory_df['Margin'].to_numpy(dtype=float) / 100,
+        "avg_discount": inventory_df['AverageDiscount'].to_numpy(dtype=float) / 100,
+        "discount_ratio": ratio,
+        "sku_to_index": {sku: i for i, sku in enumerate(skus)},
+        # product names are not unique: only the names of a single row can be looked up
+        "name_to_index": {name: i for i, name in enumerate(names) if name_counts.get(name) == 1},
+        "ambiguous_names": set(name_counts.index[name_counts > 1]),
+    }
+
+
+def inventory_arrays():
+    """
+    Returns the per-SKU arrays used for evaluation, built once per version of custom_inventory.csv.
+    Row i of every array is row i of the inventory file.
+    """
+    return data_store.derived('inventory', 'eval_arrays', _build_arrays)
+
+
+def _lookup(product, by, arrays):
+    if by in ('sku', 'any') and product in arrays['sku_to_index']:
+        return arrays['sku_to_index'][product]
+    if by in ('name', 'any'):
+        if product in arrays['name_to_index']:
+            return arrays['name_to_index'][product]
+        if product in arrays['ambiguous_names']:
+            raise ValueError(f"Product name '{product}' belongs to several SKUs, use the SKU instead.")
+    raise ValueError(f"Product '{product}' not found in inventory.")
+
+
+def to_index_array(bundles, by='sku', arrays=None):
+    """
+    Converts a list of 2-3 product bundles to an (N, 3) index array.
+
+    by: 'sku', 'name', or 'any' (a SKU, else a product name). Names shared by several
+    SKUs are rejected, since they do not tell which row to evaluate.
+    """
+    arrays = arrays if arrays is not None else inventory_arrays()
+
+    idx = np.full((len(bundles), 3), PAD, dtype=np.int64)
+    for row, bundle in enumerate(bundles):
+        if len(bundle) < 2 or len(bundle) > 3:
+            raise ValueError("Bundles must contain exactly 2 or 3 products.")
+        for col, product in enumerate(bundle):
+            idx[row, col] = _lookup(product, by, arrays)
+    return idx
+
+
+def bundle_names(idx, arrays=None):
+    """
+    Product names of the bundles of an (N, 3) index array, as tuples without the padding.
+    For display only: names are not unique, the rows identify the products.
+    """
+    arrays = arrays if arrays is not None else inventory_arrays()
+    return [tuple(arrays['name'][row[row != PAD]]) for row in np.asarray(idx, dtype=np.int64)]
+
+
+def evaluate_bundles(idx, cheapness=0.5, arrays=None):
+    """
+    Evaluates N bundles at once.
+
+    idx: (N, 3) array of inventory row indices, PAD in the last column for 2-product bundles
+    cheapness: scalar or (N,) array, 0 means zero discount, 1 means maximum discount
+
+    Returns a dict of (N,) arrays: first_price, total_price, max_discount, added_profit
+    """
+    arrays = arrays if arrays is not None else inventory_arrays()
+    idx = np.asarray(idx, dtype=np.int64)
+    if idx.ndim != 2 or idx.shape[1] != 3:
+        raise ValueError("Bundle indices must have shape (N, 3).")
+    if len(idx) and (idx[:, :2] < 0).any():
+        raise ValueError("Bundles must contain exactly 2 or 3 products.")
+
+    valid = idx != PAD
+    safe = np.where(valid, idx, 0)
+    prices = np.where(valid, arrays['price'][safe], 0.0)
+    costs = prices * (1 - arrays['margin'][safe])  # price if all margins were 0 (cost of production)
+
+    first_price = prices[:, 0]
+    total_price = prices.sum(axis=1)
+    margin_sell = costs.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discounted_price = margin_sell / (1 - DESIRED_MARGIN)
+        max_discount = (total_price - discounted_price) / total_price
+
+    new_price_total = total_price * (1 - np.asarray(cheapness, dtype=float) * max_discount)
+    added_profit = (new_price_total - first_price) * CONVERSION_RATE
+
+    return {
+        "first_price": first_price,
+        "total_price": total_price,
+        "max_discount": max_discount,
+        "added_profit": added_profit,
+    }
+
+
+# Discount optimizer
+
+DEFAULT_CHEAPNESS_GRID = np.linspace(0, 1, 21)
+DEFAULT_ELASTICITY = 10.0  # conversion grows by this much per unit of discount (10% off -> 2x conversion)
+
+
+def optimize_cheapness(idx, cheapness_grid=DEFAULT_CHEAPNESS_GRID, elasticity=DEFAULT_ELASTICITY, arrays=None):
+    """
+    Sweeps a grid of cheapness values for a batch of bundles at once.
+
+    With a fixed conversion rate every discount only lowers the added profit, so the sweep
+    uses a linear demand response: conversion = CONVERSION_RATE * (1 + elasticity * discount).
+    elasticity can be a scalar or an (N,) array. With elasticity=0 the profit curve is the
+    one evaluate_bundles computes.
+
+    The discount never goes past max_discount (the 10% desired-margin floor), and bundles
+    whose margins are already below the floor get no discount at all.
+
+    Returns a dict with:
+        cheapness: (G,) grid
+        discount, added_profit: (N, G) curves
+        best_cheapness, best_discount, best_profit: (N,) values at the best grid point
+    """
+    base = evaluate_bundles(idx, cheapness=0.0, arrays=arrays)
+    grid = np.asarray(cheapness_grid, dtype=float)
+    if grid.ndim != 1 or not len(grid) or (grid < 0).any() or (grid > 1).any():
+        raise ValueError("cheapness_grid must be a non-empty 1-D array of values in [0, 1].")
+
+    max_discount = np.nan_to_num(base['max_discount'], nan=0.0, neginf=0.0, posinf=0.0)
+    max_discount = np.clip(max_discount, 0, None)
+
+    discount = max_discount[:, None] * grid[None, :]                      # (N, G)
+    new_price_total = base['total_price'][:, None] * (1 - discount)
+    conversion = CONVERSION_RATE * (1 + np.asarray(elasticity, dtype=float).reshape(-1, 1) * discount)
+    added_profit = (new_price_total - base['first_price'][:, None]) * conversion
+
+    best = added_profit.argmax(axis=1)
+    rows = np.arange(len(best))
+
+    return {
+        "cheapness": grid,
+        "discount": discount,
+        "added_profit": added_profit,
+        "best_cheapness": grid[best],
+        "best_discount": discount[rows, best],
+        "best_profit": added_profit[rows, best],
+    }
+
+
+# Profit-ranked generation
+
+def product_terms(cheapness=0.5, arrays=None):
+    """
+    Per-product parts of the added profit: evaluate_bundles is linear in the products, so a
+    bundle (a, b, c) earns first[a] + other[b] + other[c] (first[i] = other[i] - price[i]).
+    Returns (first, other) arrays indexed like the inventory.
+    """
+    arrays = arrays if arrays is not None else inventory_arrays()
+    price = arrays['price']
+    # total * (1 - cheapness * max_discount) = (1 - cheapness) * total + cheapness * cost / (1 - DESIRED_MARGIN)
+    other = ((1 - cheapness) * price + cheapness * price * (1 - arrays['margin']) / (1 - DESIRED_MARGIN)) * CONVERSION_RATE
+    first = other - price * CONVERSION_RATE
+    return first, other
+
+
+# search nodes: a product not expanded yet, or a stream of the bundles it is the cheapest product of
+_ROOT, _SINGLES, _PAIRS, _CROSS = range(4)
+
+
+def _prefix_top2(values, starts):
+    """
+    Highest and second highest of values at the earlier positions of the same segment
+    (-inf where there are none). starts marks the first position of every segment.
+    """
+    segment = np.cumsum(starts)
+    top1 = pd.Series(values).groupby(segment).cummax().to_numpy()
+    before = np.concatenate([[-np.inf], top1[:-1]])
+    before[starts] = -np.inf
+    # a new maximum pushes the old one down to second place, any other value competes for it
+    top2 = pd.Series(np.where(values > before, before, values)).groupby(segment).cummax().to_numpy()
+    second_before = np.concatenate([[-np.inf], top2[:-1]])
+    second_before[starts] = -np.inf
+    return before, second_before
+
+
+def top_k_bundles(rows, k, size=3, groups=None, sides=None, required=None, cheapness=0.5, arrays=None):
+    """
+    The k bundles of `size` (2 or 3) products out of the inventory rows `rows` with the
+    highest added profit, as a list of (bundle rows, added profit), best first. The cheapest
+    product comes first in every bundle, which is the order that earns the most.
+
+    Optional constraints, as arrays over the inventory:
+        groups: every bundle has products with the same value (e.g. category codes)
+        sides: 2-product bundles pair a product of side 0 with one of side 1
+        required: every bundle has at least one product for which it is True
+
+    Best-first search: a bundle whose cheapest product is a earns first[a] plus the `other`
+    terms of its partners (product_terms), which are the more expensive products a can be
+    bundled with. Each product starts as a node bounded by first[a] plus the size - 1
+    highest `other` of its partners, which is the profit of its best bundle when nothing
+    else constrains it. The queue always expands its best node: a product
+    node is replaced by the streams of its bundles, each visiting its partners in order of
+    `other`, so bundles come out of the queue in order of profit. The search stops after k
+    bundles and never expands the products whose bound is below the k-th profit.
+    """
+    k = int(k)  # the GUI passes the depth as a float
+    if size not in (2, 3):
+        raise ValueError("Bundles must contain exactly 2 or 3 products.")
+    if sides is not None and size != 2:
+        raise ValueError("sides only applies to 2-product bundles.")
+    rows = np.asarray(rows, dtype=np.int64)
+    if k <= 0 or len(rows) < size:
+        return []
+
+    first, other = product_terms(cheapness, arrays)
+    price = (arrays if arrays is not None else inventory_arrays())['price']
+    group = np.asarray(groups)[rows] if groups is not None else np.zeros(len(rows), dtype=np.int64)
+
+    # by group, then from the most to the least expensive (ties by row): the partners of
+    # position p are the earlier positions of its group
+    order = np.lexsort((rows, -price[rows], group))
+    rows, group = rows[order], group[order]
+    f, o = first[rows], other[rows]
+    req = np.asarray(required, dtype=bool)[rows] if required is not None else None
+    side = np.asarray(sides)[rows] if sides is not None else None
+
+    starts = np.ones(len(rows), dtype=bool)
+    starts[1:] = group[1:] != group[:-1]
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(len(rows)), 0))
+    if side is None:
+        best, second = _prefix_top2(o, starts)
+    else:
+        best, second = np.where(
+            side == 0,
+            _prefix_top2(np.where(side == 1, o, -np.inf), starts),
+            _prefix_top2(np.where(side == 0, o, -np.inf), starts),
+        )
+    bounds = f + best + second if size == 3 else f + best
+    if req is not None:
+        # a product that is not required needs a required partner
+        if side is None:
+            best_req = _prefix_top2(np.where(req, o, -np.inf), starts)[0]
+        else:
+            best_req = np.where(
+                side == 0,
+                _prefix_top2(np.where(req & (side == 1), o, -np.inf), starts)[0],
+                _prefix_top2(np.where(req & (side == 0), o, -np.inf), starts)[0],
+            )
+        bounds = np.where(req, bounds, f + best_req + best if size == 3 else f + best_req)
+
+    ids = itertools.count()
+    heap = [
+        (-bound, True, next(ids), _ROOT, p)
+        for p, bound in enumerate(bounds.tolist())
+        if bound != -np.inf
+    ]
+    heapq.heapify(heap)
+
+    def push(kind, p, partners, i, j=None):
+        # partners: (other, positions) of one list, then of the second list for _CROSS
+        profit = f[p] + partners[0][i]
+        if kind != _SINGLES:
+            profit += partners[0 if kind == _PAIRS else 2][j]
+        heapq.heappush(heap, (-profit, False, next(ids), kind, (p, partners, i, j)))
+
+    def expand(p):
+        partners = np.arange(group_start[p], p)
+        if side is not None:
+            partners = partners[side[partners] != side[p]]
+        partners = partners[np.argsort(-o[partners], kind='stable')]
+        streams = [partners] if req is None or req[p] else [partners[req[partners]], partners[~req[partners]]]
+        if size == 2:
+            # at least one required product: a itself, or the partner
+            if len(streams[0]):
+                push(_SINGLES, p, (o[streams[0]], streams[0]), 0)
+            return
+        if len(streams[0]) >= 2:
+            push(_PAIRS, p, (o[streams[0]], streams[0]), 0, 1)
+        if len(streams) == 2 and len(streams[0]) and len(streams[1]):
+            # one required partner and one that is not
+            push(_CROSS, p, (o[streams[0]], streams[0], o[streams[1]], streams[1]), 0, 0)
+
+    result = []
+    while heap and len(result) < k:
+        # on equal values bundles come before products, which only have a bound
+        neg_profit, _, _, kind, node = heapq.heappop(heap)
+        if kind == _ROOT:
+            expand(node)
+            continue
+        p, partners, i, j = node
+        if kind == _SINGLES:
+            result.append(((rows[p], rows[partners[1][i]]), -neg_profit))
+            if i + 1 < len(partners[1]):
+                push(kind, p, partners, i + 1)
+        elif kind == _PAIRS:
+            # every pair (i, j), i < j, is reached once: from (i, j - 1), or from (i - 1, i) if j = i + 1
+            b = partners[1]
+            result.append(((rows[p], rows[b[i]], rows[b[j]]), -neg_profit))
+            if j + 1 < len(b):
+                push(kind, p, partners, i, j + 1)
+                if j == i + 1:
+                    push(kind, p, partners, j, j + 1)
+        else:
+            # every (i, j) of the required x other grid, from (i, j - 1) or from (i - 1, 0)
+            b, c = partners[1], partners[3]
+            result.append(((rows[p], rows[b[i]], rows[c[j]]), -neg_profit))
+            if j + 1 < len(c):
+                push(kind, p, partners, i, j + 1)
+            if j == 0 and i + 1 < len(b):
+                push(kind, p, partners, i + 1, 0)
+
+    return [(tuple(int(r) for r in bundle), float(profit)) for bundle, profit in result]
+
+
+PAIR_TILE = 1024  # rows per side of a block of scored pairs
+
+
+def _suffix_max(values, starts):
+    """
+    Max of values from each start position to the end.
+    """
+    return np.maximum.accumulate(np.maximum.reduceat(values, starts)[::-1])[::-1]
+
+
+def top_k_pairs(left, right, k, required=None, cheapness=0.5, arrays=None, tile=PAIR_TILE):
+    """
+    The k 2-product bundles pairing a row of `left` with a row of `right` (disjoint sets of
+    inventory rows) with the highest added profit, as a list of ((a, b) rows, added profit),
+    best first, the cheaper product first.
+
+    required: optional boolean array over the inventory; every bundle then has at least one
+    product for which it is True.
+
+    Both sides are sorted by `other` and scored in tile x tile blocks: a pair earns
+    max(first[a] + other[b], other[a] + first[b]), which puts the cheaper product first.
+    Blocks are visited from the best rows down and the scan of a row of blocks (and of the
+    whole grid) stops once its bound can not beat the k-th profit kept so far.
+    """
+    k = int(k)  # the GUI passes the depth as a float
+    left, right = np.asarray(left, dtype=np.int64), np.asarray(right, dtype=np.int64)
+    if k <= 0 or not len(left) or not len(right):
+        return []
+    first, other = product_terms(cheapness, arrays)
+    price = (arrays if arrays is not None else inventory_arrays())['price']
+
+    if required is None:
+        parts = [(left, right)]
+    else:
+        # at least one required product: a required left row, or any left row with a required right row
+        required = np.asarray(required, dtype=bool)
+        parts = [(left[required[left]], right), (left[~required[left]], right[required[right]])]
+
+    best_profit = np.empty(0)
+    best_pairs = np.empty((0, 2), dtype=np.int64)
+
+    def keep(profit, pairs):
+        nonlocal best_profit, best_pairs
+        profit, pairs = np.concatenate([best_profit, profit]), np.concatenate([best_pairs, pairs])
+        if len(profit) > k:
+            top = np.argpartition(-profit, k - 1)[:k]
+            profit, pairs = profit[top], pairs[top]
+        best_profit, best_pairs = profit, pairs
+
+    def kth():
+        return best_profit.min() if len(best_profit) == k else -np.inf
+
+    for rows_a, rows_b in parts:
+        if not len(rows_a) or not len(rows_b):
+            continue
+        rows_a = rows_a[np.argsort(-other[rows_a], kind='stable')]
+        rows_b = rows_b[np.argsort(-other[rows_b], kind='stable')]
+        starts_a, starts_b = np.arange(0, len(rows_a), tile), np.arange(0, len(rows_b), tile)
+        # bounds of every block from this one on (rows are sorted by `other`, `first` is not)
+        first_a, first_b = _suffix_max(first[rows_a], starts_a), _suffix_max(first[rows_b], starts_b)
+
+        for i, start_a in enumerate(starts_a):
+            if max(first_a[i] + other[rows_b[0]], other[rows_a[start_a]] + first_b[0]) <= kth():
+                break
+            a = rows_a[start_a:start_a + tile]
+            for j, start_b in enumerate(starts_b):
+                if max(first_a[i] + other[rows_b[start_b]], other[rows_a[start_a]] + first_b[j]) <= kth():
+                    break
+                b = rows_b[start_b:start_b + tile]
+                profit = np.maximum(first[a][:, None] + other[b][None, :], other[a][:, None] + first[b][None, :]).ravel()
+                top = np.argpartition(-profit, k - 1)[:k] if len(profit) > k else np.arange(len(profit))
+                top = top[profit[top] > kth()]
+                pairs = np.column_stack([a[top // len(b)], b[top % len(b)]])
+                keep(profit[top], pairs)
+
+    order = np.lexsort((best_pairs[:, 1], best_pairs[:, 0], -best_profit))
+    result = []
+    for (a, b), profit in zip(best_pairs[order].tolist(), best_profit[order].tolist()):
+        result.append(((a, b) if price[a] <= price[b] else (b, a), profit))
+    return result
@@ -0,0 +1,105 @@
+"""
+Co-purchase graph built from bought_together.csv (ProductA,ProductB,Count) and
+top-k triangle listing for complementary bundles.
+
+Triangles are listed with the degree-ordered (forward) algorithm: every edge is
+oriented from the endpoint with the lower (degree, id) rank to the higher one, and a
+triangle u < v < w is found exactly once, from u, by intersecting the out-neighbours
+of u and v. Out-degrees are at most sqrt(2m), so this is O(m^1.5) in the worst case.
+"""
+import heapq
+
+import pandas as pd
+
+import data_store
+import metrics
+
+
+def build_graph(bt_df):
+    """
+    Returns (labels, out_adj): node labels (SKUs) and, for every node, a dict
+    {higher ranked neighbour: pair Count}.
+    """
+    codes, labels = pd.factorize(pd.concat([bt_df['ProductA'], bt_df['ProductB']], ignore_index=True))
+    n_edges = len(bt_df)
+    a, b = codes[:n_edges], codes[n_edges:]
+    counts = bt_df['Count'].to_numpy()
+
+    # Merge duplicate / reversed pairs and drop self loops
+    weights = {}
+    for u, v, c in zip(a.tolist(), b.tolist(), counts.tolist()):
+        if u == v:
+            continue
+        key = (u, v) if u < v else (v, u)
+        weights[key] = weights.get(key, 0) + c
+
+    degree = [0] * len(labels)
+    for u, v in weights:
+        degree[u] += 1
+        degree[v] += 1
+    rank = {node: r for r, node in enumerate(sorted(range(len(labels)), key=lambda x: (degree[x], x)))}
+
+    out_adj = [dict() for _ in range(len(labels))]
+    for (u, v), c in weights.items():
+        if rank[u] < rank[v]:
+            out_adj[u][v] = c
+        else:
+            out_adj[v][u] = c
+
+    return list(labels), out_adj
+
+
+def get_graph():
+    """
+    The co-purchase graph, built once per version of bought_together.csv.
+    """
+    return data_store.derived('bought_together', 'graph', build_graph)
+
+
+def top_k_triangles(k, keep=None, graph=None):
+    """
+    Returns the k triangles with the highest total pair Count as a list of
+    (sorted SKU tuple, score), best first.
+
+    keep: optional function taking the SKU tuple, triangles it rejects are skipped.
+    """
+    k = int(k)  # the GUI passes the depth as a float
+    labels, out_adj = graph if graph is not None else get_graph()
+    if k <= 0:
+        return []
+
+    with metrics.span('bundles.triangles'):
+        heap, found = _top_k_triangles(k, keep, labels, out_adj)
+    metrics.count('bundles.triangles.found', found)
+
+    # Ties on score are broken by the SKU tuple, consistently with what the heap kept
+    return [(skus, score) for score, skus in sorted(heap, reverse=True)]
+
+
+def _top_k_triangles(k, keep, labels, out_adj):
+    """
+    Returns (min-heap of the best k (score, skus), number of triangles found).
+    """
+    heap = []  # min-heap of (score, skus), holds the best k seen so far
+    found = 0
+    for u, out_u in enumerate(out_adj):
+        if len(out_u) < 2:
+            continue
+        for v, w_uv in out_u.items():
+            out_v = out_adj[v]
+            small, large = (out_u, out_v) if len(out_u) <= len(out_v) else (out_v, out_u)
+            for w in small:
+                if w not in large:
+                    continue
+                found += 1
+                score = w_uv + out_u[w] + out_v[w]
+                if len(heap) == k and score < heap[0][0]:
+                    continue
+                skus = tuple(sorted((labels[u], labels[v], labels[w])))
+                if keep is not None and not keep(skus):
+                    continue
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, skus))
+                elif (score, skus) > heap[0]:
+                    heapq.heapreplace(heap, (score, skus))
+    return heap, found
@@ -0,0 +1,135 @@
+"""
+Typed binary cache for the CSV files under ../data.
+
+The first read of a CSV parses it and stores the resulting DataFrame in ../data/.cache,
+as Parquet if pyarrow is installed and as a pandas pickle otherwise. Both keep the
+column types, so dates come back as datetime64 (int64 epochs) without re-parsing.
+Entries are keyed by a hash of the file contents and of the read_csv arguments, so an
+edited file or a different parse_dates gets a new entry and never a stale one.
+
+Hashing a large file on every start would cost as much as reading it, so the hash is
+remembered in .cache/hashes.json next to the file's mtime and size and recomputed only
+when those change.
+
+Set COLUMN_CACHE=0 to always read the CSV.
+"""
+import hashlib
+import json
+import os
+import threading
+import pandas as pd
+
+import metrics
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = 'parquet'
+except ImportError:
+    CACHE_FORMAT = 'pkl'
+
+_lock = threading.Lock()
+
+
+def enabled():
+    return os.getenv("COLUMN_CACHE", "1") != "0"
+
+
+def cache_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+
+
+def _hash_file(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    """
+    Content hash of a file, recomputed only when its mtime or size changes.
+    """
+    st = os.stat(path)
+    index_path = os.path.join(cache_dir(path), 'hashes.json')
+    key = os.path.abspath(path)
+
+    with _lock:
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        entry = index.get(key)
+        if entry and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            return entry['hash']
+
+        digest = _hash_file(path)
+        index[key] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'hash': digest}
+        try:
+            os.makedirs(cache_dir(path), exist_ok=True)
+            tmp_path = index_path + f'.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            print(f"Column cache: could not save file hashes: {e}")
+        return digest
+
+
+def _entry_path(path, read_kwargs):
+    args_hash = hashlib.blake2b(repr(sorted(read_kwargs.items())).encode(), digest_size=4).hexdigest()
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir(path), f"{name}-{file_hash(path)[:16]}-{args_hash}.{CACHE_FORMAT}")
+
+
+def _read_entry(entry_path):
+    if CACHE_FORMAT == 'parquet':
+        return pd.read_parquet(entry_path)
+    return pd.read_pickle(entry_path)
+
+
+def _write_entry(df, entry_path):
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    tmp_path = entry_path + f'.{os.getpid()}.tmp'
+    if CACHE_FORMAT == 'parquet':
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, entry_path)
+
+    # drop entries of older versions of the same file
+    prefix = os.path.basename(entry_path).rsplit('-', 2)[0] + '-'
+    suffix = os.path.basename(entry_path).rsplit('-', 1)[1]
+    for other in os.listdir(os.path.dirname(entry_path)):
+        if other.startswith(prefix) and other.endswith(suffix) and other != os.path.basename(entry_path):
+            try:
+                os.remove(os.path.join(os.path.dirname(entry_path), other))
+            except OSError:
+                pass
+
+
+def read_csv(path, **read_kwargs):
+    """
+    Same as pd.read_csv(path, **read_kwargs), served from the binary cache when possible.
+    """
+    if not enabled():
+        return pd.read_csv(path, **read_kwargs)
+
+    entry_path = _entry_path(path, read_kwargs)
+    if os.path.exists(entry_path):
+        try:
+            df = _read_entry(entry_path)
+            metrics.count('column_cache.hits')
+            return df
+        except Exception as e:
+            print(f"Column cache: could not read {entry_path}, re-parsing the CSV: {e}")
+
+    df = pd.read_csv(path, **read_kwargs)
+    metrics.count('column_cache.misses')
+    try:
+        _write_entry(df, entry_path)
+    except Exception as e:
+        print(f"Column cache: could not write {entry_path}: {e}")
+    return df
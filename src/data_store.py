@@ -0,0 +1,163 @@
+"""
+Process-wide store for the files under ../data.
+
+Every file is parsed once per process and kept in memory. Before handing it out
+the store checks the file's mtime and size, so a file rewritten by the preprocess
+scripts is picked up on the next call without restarting the GUI.
+
+Files are parsed through column_cache, so a file that did not change since the last
+run is loaded from its typed binary copy instead of being parsed again.
+
+Callers get shallow copies: adding or dropping columns on them does not affect
+the cached frame, but the values are shared, so treat them as read-only.
+"""
+import os
+import threading
+import column_cache
+import metrics
+
+
+DATA_DIR = '../data'
+
+# name -> (file name, read_csv keyword arguments)
+SOURCES = {
+    'inventory': ('custom_inventory.csv', {}),
+    'bought_together': ('bought_together.csv', {}),
+    'orders': ('orders.csv', {'parse_dates': ['CreatedDate']}),
+    'custom_orders': ('custom_orders.csv', {'parse_dates': ['CreatedDate']}),
+    # one row per day, written by preprocess/get_daily_orders.py
+    'daily_orders': ('daily_orders.csv', {'parse_dates': ['OrderDate']}),
+}
+
+# name -> preprocess script that writes the file, named in the error when it is missing
+PRODUCERS = {
+    'inventory': 'preprocess/update_inventory.py',
+    'bought_together': 'preprocess/get_bought_together.py',
+    'custom_orders': 'preprocess/update_orders.py',
+    'daily_orders': 'preprocess/get_daily_orders.py',
+}
+
+_lock = threading.RLock()
+_frames = {}   # name -> (signature, DataFrame)
+_derived = {}  # (name, key) -> (signature, value)
+
+
+def source_path(name):
+    if name not in SOURCES:
+        raise ValueError(f"Unknown data source: {name}")
+    return os.path.join(DATA_DIR, SOURCES[name][0])
+
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_frame(name):
+    """
+    Returns (signature, DataFrame) for a source, re-reading the file only if it changed.
+    """
+    path = source_path(name)
+    try:
+        sig = _signature(path)
+    except FileNotFoundError:
+        if name not in PRODUCERS:
+            raise
+        raise FileNotFoundError(f"{path} not found, run {PRODUCERS[name]} to create it.") from None
+    with _lock:
+        entry = _frames.get(name)
+        if entry is None or entry[0] != sig:
+            with metrics.span(f'data.load.{name}'):
+                df = column_cache.read_csv(path, **SOURCES[name][1])
+            metrics.count('data.loads')
+            entry = (sig, df)
+            _frames[name] = entry
+        else:
+            metrics.count('data.hits')
+        return entry
+
+
+def load(name):
+    """
+    Returns a read-only view of a data file (see SOURCES for the names).
+    """
+    _, df = _load_frame(name)
+    return df.copy(deep=False)
+
+
+def snapshot(name):
+    """
+    (signature, read-only view) of a data file, for handing it to other processes (shared_catalog.py).
+    """
+    sig, df = _load_frame(name)
+    return sig, df.copy(deep=False)
+
+
+def preload(name, signature, df):
+    """
+    Uses df as the contents of a data file for as long as the file keeps this signature.
+    """
+    with _lock:
+        _frames[name] = (signature, df)
+
+
+def derived(name, key, builder):
+    """
+    Returns builder(df) for a data source, computed once per version of the file.
+    Use it for lookups and arrays that are built from a source and reused across calls.
+    The returned object is shared between callers and must not be modified.
+    """
+    sig, df = _load_frame(name)
+    with _lock:
+        entry = _derived.get((name, key))
+        if entry is not None and entry[0] == sig:
+            return entry[1]
+    with metrics.span(f'data.derive.{key}'):
+        value = builder(df.copy(deep=False))
+    with _lock:
+        _derived[(name, key)] = (sig, value)
+    return value
+
+
+def version():
+    """
+    Signatures of every data file (None for a missing one); changes when any of them is rewritten.
+    """
+    signatures = []
+    for name in SOURCES:
+        try:
+            signatures.append(_signature(source_path(name)))
+        except FileNotFoundError:
+            signatures.append(None)
+    return tuple(signatures)
+
+
+def clear():
+    """
+    Drops every cached frame and derived value.
+    """
+    with _lock:
+        _frames.clear()
+        _derived.clear()
+
+
+# Convenience accessors
+
+def get_inventory():
+    return load('inventory')
+
+
+def get_bought_together():
+    return load('bought_together')
+
+
+def get_orders():
+    return load('orders')
+
+
+def get_custom_orders():
+    return load('custom_orders')
+
+
+def get_daily_orders():
+    return load('daily_orders')
@@ -0,0 +1,98 @@
+"""
+Concurrent, rate-limited batch of Gemini requests.
+
+Prompts are answered from gemini_cache when possible, the rest run on a thread pool with
+at most max_workers calls in flight and a token bucket that keeps the request rate under
+the API quota. Each call has a timeout and is retried with exponential backoff; after the
+last failed attempt the fallback value is used (and not cached).
+
+Defaults come from GEMINI_MAX_CONCURRENCY, GEMINI_REQUESTS_PER_MINUTE, GEMINI_RETRIES and
+GEMINI_TIMEOUT. To test without the real API point GEMINI_API_ENDPOINT to a local fake
+server (see gemini_client.py) or pass your own request_fn.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import gemini_cache
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _call_with_retries(prompt, request_fn, bucket, retries, backoff, timeout):
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            result = request_fn(prompt, timeout=timeout)
+        except Exception as e:
+            print(f"Gemini request failed (attempt {attempt + 1}/{retries + 1}): {e}")
+            result = None
+        if result is not None:
+            return result
+        if attempt < retries:
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random() / 2))
+    return None
+
+
+def run_batch(prompts, request_fn, model, fallback,
+              max_workers=None, requests_per_minute=None, retries=None, backoff=1.0, timeout=None):
+    """
+    Answers every prompt, in order.
+
+    request_fn(prompt, timeout=...) returns the parsed answer, or None / raises on failure.
+    Identical prompts are sent once. Answers are cached under (model, prompt).
+    """
+    max_workers = max_workers or int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+    requests_per_minute = requests_per_minute or float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 60))
+    retries = retries if retries is not None else int(os.getenv("GEMINI_RETRIES", 3))
+    timeout = timeout or float(os.getenv("GEMINI_TIMEOUT", 30))
+
+    answers = {}
+    missing = []
+    for prompt in dict.fromkeys(prompts):
+        cached = gemini_cache.get(model, prompt)
+        if cached is not None:
+            answers[prompt] = cached
+        else:
+            missing.append(prompt)
+
+    if missing:
+        print(f"Gemini batch: {len(answers)} cached, {len(missing)} to request")
+        bucket = TokenBucket(requests_per_minute / 60, capacity=max_workers)
+
+        def work(prompt):
+            result = _call_with_retries(prompt, request_fn, bucket, retries, backoff, timeout)
+            if result is not None:
+                gemini_cache.put(model, prompt, result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for prompt, result in zip(missing, executor.map(work, missing)):
+                answers[prompt] = result
+
+    return [answers[p] if answers[p] is not None else dict(fallback) for p in prompts]
@@ -0,0 +1,111 @@
+"""
+Persistent cache for Gemini answers, stored in an SQLite file under ../data/.cache.
+
+Entries are keyed by a hash of the model name and the full prompt, so the same shopping
+history sent to the same model is answered from disk. Entries expire after
+GEMINI_CACHE_TTL seconds (default 30 days), and when there are more than
+GEMINI_CACHE_MAX_ENTRIES (default 10000) the least recently used ones are dropped.
+Only real answers are stored, callers must not put fallback values in the cache.
+
+Set GEMINI_CACHE=0 to disable it.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import metrics
+
+CACHE_PATH = '../data/.cache/gemini.sqlite'
+
+
+def enabled():
+    return os.getenv("GEMINI_CACHE", "1") != "0"
+
+
+def _ttl():
+    return float(os.getenv("GEMINI_CACHE_TTL", 30 * 24 * 3600))
+
+
+def _max_entries():
+    return int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", 10000))
+
+
+@contextmanager
+def _connect():
+    """
+    Opens the cache database, commits on success and always closes it.
+    """
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    try:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            yield conn
+    finally:
+        conn.close()
+
+
+def make_key(model, prompt):
+    return hashlib.sha256(f"{model}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+def get(model, prompt):
+    """
+    Returns the cached answer for (model, prompt), or None.
+    """
+    if not enabled():
+        return None
+    key = make_key(model, prompt)
+    now = time.time()
+    try:
+        with _connect() as conn:
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                metrics.count('gemini_cache.misses')
+                return None
+            if row[1] < now - _ttl():
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                metrics.count('gemini_cache.misses')
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            metrics.count('gemini_cache.hits')
+            return json.loads(row[0])
+    except sqlite3.Error as e:
+        print(f"Gemini cache error: {e}")
+        return None
+
+
+def put(model, prompt, value):
+    """
+    Stores an answer, then drops expired entries and the least recently used ones over the size limit.
+    """
+    if not enabled():
+        return
+    key = make_key(model, prompt)
+    now = time.time()
+    try:
+        with _connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            conn.execute("DELETE FROM entries WHERE created < ?", (now - _ttl(),))
+            excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - _max_entries()
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)",
+                    (excess,)
+                )
+    except sqlite3.Error as e:
+        print(f"Gemini cache error: {e}")
+
+
+def clear():
+    with _connect() as conn:
+        conn.execute("DELETE FROM entries")
@@ -0,0 +1,40 @@
+"""
+Gemini client shared by user_profiling.py and gui.py.
+
+Importing this module only reads the settings from .env. google.generativeai is imported
+and configured on the first generative_model() call, so modules that may never call
+Gemini do not pay for it at startup.
+"""
+import os
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables from .env
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL")
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")  # e.g. a local fake server for tests
+
+_lock = threading.Lock()
+_genai = None
+
+
+def get_genai():
+    """
+    The google.generativeai module, imported and configured on the first call.
+    """
+    global _genai
+    with _lock:
+        if _genai is None:
+            import google.generativeai as genai
+            if GEMINI_API_ENDPOINT:
+                genai.configure(api_key=GEMINI_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+            else:
+                genai.configure(api_key=GEMINI_API_KEY)
+            _genai = genai
+        return _genai
+
+
+def generative_model(model_name=None):
+    return get_genai().GenerativeModel(model_name or GEMINI_MODEL)
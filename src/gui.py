@@ -3,18 +3,8 @@ import gradio as gr
 import random
 import string, re, os, json
 
-from dotenv import load_dotenv
-import google.generativeai as genai
-
-load_dotenv()
-
-# Gemini setup
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL = os.getenv("GEMINI_MODEL")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-from user_profiling import get_user_profile
+# Gemini is configured on the first chatbot request, data files are loaded on the first query
+import gemini_client
 from suggest_bundles import get_bundles, get_all_bundles, sort_bundles, print_bundles
 
 
@@ -23,7 +13,7 @@ BUNDLE_TYPES = ["complementary", "thematic", "cross-margin", "personalized", "se
 
 def parse_bundle_request_gemini(user_prompt):
 
-    model = genai.GenerativeModel(GEMINI_MODEL)
+    model = gemini_client.generative_model()
 
     prompt = (
         "You are an assistant that extracts structured request parameters for bundle generation.\n\n"
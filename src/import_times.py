@@ -0,0 +1,79 @@
+"""
+Import time of the modules in src, to catch modules that start doing work at import again.
+
+    python import_times.py                            # every module
+    python import_times.py gui suggest_bundles --budget 50
+
+Each module is imported in a fresh interpreter with -X importtime. The report shows the
+total milliseconds of the import and the part spent in the repo's own modules (their
+module-level code); the rest is third-party libraries such as pandas or gradio.
+With --budget the script exits with status 1 if a module's own time is over that many ms.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def src_modules():
+    return sorted(
+        name[:-3] for name in os.listdir(SRC_DIR)
+        if name.endswith('.py') and name != os.path.basename(__file__)
+    )
+
+
+def import_time(module, repo_modules):
+    """
+    Returns (total_ms, repo_ms) for importing module in a new interpreter,
+    or None if the import fails.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(f"{module}: import failed\n{result.stderr.strip().splitlines()[-1]}")
+        return None
+
+    total_us = repo_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if name in repo_modules:
+            repo_us += int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+    return total_us / 1000, repo_us / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', help="modules to import (default: every module in src)")
+    parser.add_argument('--budget', type=float, help="maximum ms of the repo's own code per import")
+    args = parser.parse_args()
+
+    repo_modules = set(src_modules())
+    over_budget = []
+    print(f"{'module':<20} {'total ms':>10} {'own ms':>10}")
+    for module in args.modules or sorted(repo_modules):
+        times = import_time(module, repo_modules)
+        if times is None:
+            over_budget.append(module)
+            continue
+        total_ms, repo_ms = times
+        print(f"{module:<20} {total_ms:>10.1f} {repo_ms:>10.1f}")
+        if args.budget is not None and repo_ms > args.budget:
+            over_budget.append(module)
+
+    if over_budget:
+        print(f"Over budget or failed: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
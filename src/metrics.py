@@ -0,0 +1,172 @@
+"""
+Process-wide timing spans and counters.
+
+    with metrics.span('bundles.complementary'):
+        ...
+    metrics.count('bundles.evaluated', len(bundles))
+
+    @metrics.timed('profile.user')
+    def get_user_profile(userid): ...
+
+Recording is off unless METRICS=1 is set (or enable() is called). When it is off, span()
+hands out one shared no-op context manager and count() returns after a flag check, so
+the instrumented code costs next to nothing.
+
+snapshot() returns what was recorded, to_json() and to_prometheus() export it. With
+METRICS_OUTPUT=<path> the JSON (or Prometheus text, for a path ending in .prom) is written
+when the process exits, which is how the preprocess scripts report theirs.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROMETHEUS_PREFIX = 'atcom'
+
+_enabled = os.getenv("METRICS", "0") == "1"
+_lock = threading.Lock()
+_spans = {}     # name -> [calls, total seconds, min seconds, max seconds]
+_counters = {}  # name -> value
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def record(name, seconds):
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            _spans[name] = [1, seconds, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = min(stats[2], seconds)
+            stats[3] = max(stats[3], seconds)
+
+
+@contextmanager
+def _timed_span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """
+    Context manager that adds the time spent inside it to the span called name.
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return _timed_span(name)
+
+
+def timed(name):
+    """
+    Decorator version of span().
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _timed_span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot():
+    """
+    {'spans': {name: {calls, seconds, min_seconds, max_seconds}}, 'counters': {name: value}}
+    """
+    with _lock:
+        spans = {
+            name: {'calls': calls, 'seconds': total, 'min_seconds': low, 'max_seconds': high}
+            for name, (calls, total, low, high) in sorted(_spans.items())
+        }
+        counters = dict(sorted(_counters.items()))
+    return {'spans': spans, 'counters': counters}
+
+
+def to_json(indent=2):
+    return json.dumps(snapshot(), indent=indent)
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def to_prometheus(prefix=PROMETHEUS_PREFIX):
+    """
+    Prometheus text exposition format, with the span / counter name as a label.
+    """
+    data = snapshot()
+    lines = [
+        f"# HELP {prefix}_span_seconds_total Time spent in each span.",
+        f"# TYPE {prefix}_span_seconds_total counter",
+    ]
+    lines += [f'{prefix}_span_seconds_total{{span="{_label(n)}"}} {s["seconds"]:.6f}' for n, s in data['spans'].items()]
+    lines += [
+        f"# HELP {prefix}_span_calls_total Number of times each span was entered.",
+        f"# TYPE {prefix}_span_calls_total counter",
+    ]
+    lines += [f'{prefix}_span_calls_total{{span="{_label(n)}"}} {s["calls"]}' for n, s in data['spans'].items()]
+    lines += [
+        f"# HELP {prefix}_events_total Counted events.",
+        f"# TYPE {prefix}_events_total counter",
+    ]
+    lines += [f'{prefix}_events_total{{name="{_label(n)}"}} {v}' for n, v in data['counters'].items()]
+    return "\n".join(lines) + "\n"
+
+
+def write(path):
+    text = to_prometheus() if path.endswith('.prom') else to_json()
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def _write_at_exit():
+    path = os.getenv("METRICS_OUTPUT")
+    if _enabled and path:
+        try:
+            write(path)
+        except OSError as e:
+            print(f"Could not write metrics to {path}: {e}")
+
+
+atexit.register(_write_at_exit)
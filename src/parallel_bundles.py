@@ -0,0 +1,76 @@
+"""
+Parallel mode of suggest_bundles.get_all_bundles: the bundle types are generated at the
+same time in a pool of worker processes (get_all_bundles(workers=n) or BUNDLE_WORKERS=n).
+
+The workers are started once, with the spawn method so that it is safe next to the GUI's
+threads, and kept while the data files don't change. They get the inventory and
+co-purchase tables through shared memory (shared_catalog.py) instead of each one reading
+the files; personalized bundles read the orders in their worker.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import data_store
+import shared_catalog
+
+_lock = threading.RLock()
+_pool = None  # (data version, workers, executor, shared memory blocks)
+
+
+def default_workers():
+    """
+    Worker processes from the BUNDLE_WORKERS environment variable, 0 (no pool) if unset.
+    """
+    return int(os.getenv("BUNDLE_WORKERS", "0") or 0)
+
+
+def _init_worker(handle):
+    shared_catalog.attach(handle)
+
+
+def _generate(query):
+    import suggest_bundles
+    return suggest_bundles.get_bundles(**query)
+
+
+def _get_executor(workers):
+    global _pool
+    version = data_store.version()
+    with _lock:
+        if _pool is not None and _pool[:2] == (version, workers):
+            return _pool[2]
+        shutdown()
+        handle, blocks = shared_catalog.publish()
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(handle,)
+        )
+        _pool = (version, workers, executor, blocks)
+        return executor
+
+
+def shutdown():
+    """
+    Stops the workers and frees the shared tables.
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            return
+        _, _, executor, blocks = _pool
+        _pool = None
+        executor.shutdown(wait=True)
+        shared_catalog.release(blocks)
+
+
+atexit.register(shutdown)
+
+
+def generate(queries, workers):
+    """
+    suggest_bundles.get_bundles(**query) for every query, computed in the pool, in the order of queries.
+    """
+    return list(_get_executor(workers).map(_generate, queries))
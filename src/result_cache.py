@@ -0,0 +1,104 @@
+"""
+In-process LRU cache for bundle queries (suggest_bundles.get_bundles / get_all_bundles).
+
+Results are keyed by the normalized query and by the version of the data behind it:
+the signatures of the data files (data_store.version()) and of a stamp file that
+invalidate() rewrites. The preprocess scripts call invalidate() after writing the data
+files, which also reaches other processes such as a running GUI through the stamp file.
+
+At most RESULT_CACHE_MAX_ENTRIES (default 256) results are kept, the least recently used
+go first, and a result expires RESULT_CACHE_TTL seconds (default 600) after it was
+computed. Set RESULT_CACHE=0 to disable the cache.
+
+Cached results are shared between callers, treat them as read-only.
+Hits and misses are counted in stats() and as the result_cache.hits / result_cache.misses metrics.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import data_store
+import metrics
+
+STAMP_PATH = '../data/.cache/results.stamp'
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (data version, expiry time, value)
+_stats = {'hits': 0, 'misses': 0}
+
+
+def enabled():
+    return os.getenv("RESULT_CACHE", "1") != "0"
+
+
+def _ttl():
+    return float(os.getenv("RESULT_CACHE_TTL", 600))
+
+
+def _max_entries():
+    return int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 256))
+
+
+def _stamp():
+    try:
+        return os.stat(STAMP_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def data_version():
+    """
+    Changes whenever a data file is rewritten or invalidate() is called, in any process.
+    """
+    return data_store.version(), _stamp()
+
+
+def cached(key, compute):
+    """
+    Returns compute() for a hashable query key, computed once per data version while the entry lives.
+    """
+    if not enabled():
+        return compute()
+
+    version = data_version()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            metrics.count('result_cache.hits')
+            return entry[2]
+        _stats['misses'] += 1
+    metrics.count('result_cache.misses')
+
+    value = compute()
+    with _lock:
+        _entries[key] = (version, time.monotonic() + _ttl(), value)
+        _entries.move_to_end(key)
+        while len(_entries) > _max_entries():
+            _entries.popitem(last=False)
+    return value
+
+
+def invalidate():
+    """
+    Drops every cached result, here and in the other processes using the same data directory.
+    """
+    with _lock:
+        _entries.clear()
+    previous = _stamp() or 0
+    os.makedirs(os.path.dirname(STAMP_PATH), exist_ok=True)
+    with open(STAMP_PATH, 'w') as f:
+        f.write(str(time.time_ns()))
+    # the new stamp must differ even on file systems with coarse timestamps
+    stamp = max(time.time_ns(), previous + 1)
+    os.utime(STAMP_PATH, ns=(stamp, stamp))
+
+
+def stats():
+    """
+    {'hits', 'misses', 'size'} of this process.
+    """
+    with _lock:
+        return {**_stats, 'size': len(_entries)}
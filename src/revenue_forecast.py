@@ -1,20 +1,71 @@
+"""
+Daily revenue forecast with XGBoost, with and without the expected bundling revenue.
+
+Importing the module does no work. get_model() returns a fitted model for the current
+orders, trained once and then stored under ../data/.cache/models together with its
+feature metadata; the file name is a hash of the daily revenue series and the
+hyperparameters, so later runs reload it and retrain only when either of them changes.
+When the orders only gained new days, the stored model is updated instead (update_model) and
+get_forecast() rolls the stored forecast forward rather than forecasting every day again.
+get_forecast(mode='direct') uses the direct multi-horizon model instead (train_direct_model),
+which predicts every day of the horizon in one batch.
+Run the script to train (or reload), forecast and plot:
+
+    python revenue_forecast.py            # recursive forecast
+    python revenue_forecast.py direct     # direct multi-horizon forecast
+"""
+import hashlib
+import json
+import os
+import sys
+import time
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from xgboost import XGBRegressor
 
-from suggest_bundles import get_average_added_profit
+import data_store
+
+# xgboost, matplotlib and suggest_bundles are imported where they are used, so importing
+# this module (e.g. for get_forecast) stays cheap
+
+MODEL_DIR = '../data/.cache/models'
+
+MODEL_PARAMS = {
+    'n_estimators': 1000,
+    'learning_rate': 0.05,
+    'max_depth': 5,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'random_state': 42,
+    'early_stopping_rounds': 50,
+    'verbosity': 0,
+}
+
+# Updates when new days of orders arrive (see update_model and roll_forecast)
+UPDATE_ROUNDS = 50         # boosting rounds added by a warm start
+REFRESH_TOLERANCE = 0.05   # error on the new days below which the stored model is kept as is
+DRIFT_THRESHOLD = 0.5      # error on the new days above which the model is refit from scratch
+MAX_WARM_DAYS = 30         # days added by updates before the next full refit
+ROLL_HORIZON = 28          # days forecast again when rolling a stored forecast forward
 
-# Load and preprocess your data here (same as before)
-orders = pd.read_csv('../data/orders.csv', parse_dates=['CreatedDate'])
-orders['OrderDate'] = orders['CreatedDate'].dt.date
-unique_orders = orders.drop_duplicates(subset=['OrderNumber'])
-daily_revenue = unique_orders.groupby('OrderDate')['TotalOrderAmount'].sum().reset_index()
-daily_revenue['OrderDate'] = pd.to_datetime(daily_revenue['OrderDate'])
-daily_revenue = daily_revenue.sort_values('OrderDate').reset_index(drop=True)
+# Stored models and forecasts (one set per model_key)
+MAX_STORED_MODELS = 8      # the least recently used past this many are removed
+MAX_MODEL_AGE_DAYS = 30    # models not used for this long are removed
+
+
+def load_daily_revenue():
+    """
+    Revenue per day (one row per calendar day, 0 for days without orders),
+    with the calendar and lag features used by the model.
+    Read from the daily order totals (daily_orders.csv), not from the order log.
+    """
+    daily_orders = data_store.get_daily_orders()
+    daily_revenue = daily_orders[['OrderDate', 'Revenue']].rename(columns={'Revenue': 'TotalOrderAmount'})
+    daily_revenue = daily_revenue.sort_values('OrderDate').reset_index(drop=True)
+
+    all_days = pd.date_range(daily_revenue['OrderDate'].min(), daily_revenue['OrderDate'].max())
+    daily_revenue = daily_revenue.set_index('OrderDate').reindex(all_days, fill_value=0).rename_axis('OrderDate').reset_index()
+    return add_lag_features(create_features(daily_revenue))
 
-all_days = pd.date_range(daily_revenue['OrderDate'].min(), daily_revenue['OrderDate'].max())
-daily_revenue = daily_revenue.set_index('OrderDate').reindex(all_days, fill_value=0).rename_axis('OrderDate').reset_index()
 
 # Feature engineering function
 def create_features(df):
@@ -24,94 +75,500 @@ def create_features(df):
     df['quarter'] = df['OrderDate'].dt.quarter
     return df
 
-# Initial features + lag creation (lag features for training)
-daily_revenue = create_features(daily_revenue)
+N_LAGS = 7
+features = ['day_of_week', 'day_of_month', 'month', 'quarter'] + [f'lag_{i}' for i in range(1, N_LAGS + 1)]
+# columns of build_direct_training_set: the lags are those of the forecast origin
+direct_features = features[:4] + ['horizon'] + features[4:]
+target = 'TotalOrderAmount'
+FORECAST_MODES = ('recursive', 'direct')
 
-# Add lag features for training data (shifted revenue values)
-for lag in range(1, 8):
-    daily_revenue[f'lag_{lag}'] = daily_revenue['TotalOrderAmount'].shift(lag).fillna(0)
 
-# Prepare training dataset
-features = ['day_of_week', 'day_of_month', 'month', 'quarter'] + [f'lag_{i}' for i in range(1, 8)]
-target = 'TotalOrderAmount'
+def calendar_features(dates):
+    """
+    (len(dates), 4) array with the create_features columns for a DatetimeIndex.
+    """
+    return np.column_stack([dates.dayofweek, dates.day, dates.month, dates.quarter]).astype(float)
+
+
+def recursive_forecast(model, history_df, fh):
+    """
+    Forecasts fh days after the last day of history_df (OrderDate, TotalOrderAmount), one day
+    at a time, feeding each prediction back as lag_1 of the next day.
+
+    The last N_LAGS values live in a ring buffer and the feature rows are preallocated,
+    so each step is one small predict call and no pandas work.
+    Returns a DataFrame with OrderDate, the feature columns and TotalOrderAmount.
+    """
+    last_date = history_df['OrderDate'].iloc[-1]
+    future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=fh)
+
+    history = np.nan_to_num(history_df['TotalOrderAmount'].to_numpy(dtype=float)[-N_LAGS:])
+    ring = np.zeros(N_LAGS)
+    ring[N_LAGS - len(history):] = history  # days before the history count as 0
+    head = 0  # ring[head] is the oldest value, ring[head - 1] the newest
+
+    X = np.zeros((fh, len(features)))
+    X[:, :4] = calendar_features(future_dates)
+    preds = np.empty(fh)
+
+    for i in range(fh):
+        # lag_k is the value k days back: ring[head - k]
+        X[i, 4:] = ring[(head - np.arange(1, N_LAGS + 1)) % N_LAGS]
+        preds[i] = model.predict(X[i:i + 1])[0]
+        ring[head] = preds[i]
+        head = (head + 1) % N_LAGS
+
+    future_df = pd.DataFrame(X, columns=features)
+    future_df[features[:4]] = future_df[features[:4]].astype(int)
+    future_df.insert(0, 'OrderDate', future_dates)
+    future_df['TotalOrderAmount'] = preds
+    return future_df
+
+
+def roll_forecast(model, previous_df, history_df, fh, horizon=None):
+    """
+    Moves a forecast made by the same model from a shorter history to the end of history_df.
+
+    The first horizon days (ROLL_HORIZON by default) are forecast again from the new actual values
+    and the days after them are taken from previous_df; days past its end are forecast from its tail.
+    A new day changes every later step of the recursion a little, but after a few weeks the
+    forecast is driven by the calendar features, so the reused tail only differs by noise.
+    """
+    horizon = ROLL_HORIZON if horizon is None else horizon
+    last_date = history_df['OrderDate'].iloc[-1]
+    tail = previous_df[previous_df['OrderDate'] > last_date + pd.Timedelta(days=horizon)]
+    if fh <= horizon or tail.empty or tail['OrderDate'].iloc[0] != last_date + pd.Timedelta(days=horizon + 1):
+        return recursive_forecast(model, history_df, fh)
+
+    parts = [recursive_forecast(model, history_df, horizon), tail.iloc[:fh - horizon]]
+    missing = fh - horizon - len(parts[1])
+    if missing > 0:
+        parts.append(recursive_forecast(model, pd.concat(parts, ignore_index=True), missing))
+    return pd.concat(parts, ignore_index=True)
+
+
+def build_direct_training_set(history_df, horizon):
+    """
+    Training rows for the direct multi-horizon model: for every origin day t and h in 1..horizon,
+    features are the calendar of day t+h, h, and the N_LAGS values up to day t; the target is the value at t+h.
+    """
+    values = history_df['TotalOrderAmount'].to_numpy(dtype=float)
+    calendar = calendar_features(pd.DatetimeIndex(history_df['OrderDate']))
+    padded = np.concatenate([np.zeros(N_LAGS), values])
+
+    # lags[t] = values at t, t-1, ..., t-N_LAGS+1 (the lags of day t+1)
+    lags = np.lib.stride_tricks.sliding_window_view(padded, N_LAGS)[1:][:, ::-1]
+
+    origins, horizons = np.meshgrid(np.arange(len(values)), np.arange(1, horizon + 1), indexing='ij')
+    origins, horizons = origins.ravel(), horizons.ravel()
+    targets = origins + horizons
+    keep = targets < len(values)
+    origins, horizons, targets = origins[keep], horizons[keep], targets[keep]
+
+    X = np.column_stack([calendar[targets], horizons, lags[origins]])
+    y = values[targets]
+    return X, y
+
+
+def direct_forecast(model, history_df, fh):
+    """
+    Forecasts fh days with a model trained on build_direct_training_set, in one batched predict.
+    """
+    last_date = history_df['OrderDate'].iloc[-1]
+    future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=fh)
+
+    values = np.nan_to_num(history_df['TotalOrderAmount'].to_numpy(dtype=float))
+    last_lags = np.zeros(N_LAGS)
+    recent = values[::-1][:N_LAGS]
+    last_lags[:len(recent)] = recent
+
+    X = np.column_stack([calendar_features(future_dates), np.arange(1, fh + 1), np.tile(last_lags, (fh, 1))])
+    return pd.DataFrame({'OrderDate': future_dates, 'TotalOrderAmount': model.predict(X)})
+
+
+def add_lag_features(df):
+    # lag features for training (shifted revenue values)
+    for lag in range(1, N_LAGS + 1):
+        df[f'lag_{lag}'] = df['TotalOrderAmount'].shift(lag).fillna(0)
+    return df
+
+
+def model_key(daily_revenue, params=None, mode='recursive', horizon=None):
+    """
+    Hash of the training series, the features and the hyperparameters
+    (and of the horizon for a direct model).
+    """
+    params = MODEL_PARAMS if params is None else params
+    config = {'features': features, 'params': params}
+    if mode == 'direct':
+        config = {'features': direct_features, 'params': params, 'mode': mode, 'horizon': horizon}
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.util.hash_pandas_object(daily_revenue[['OrderDate', target]], index=False).to_numpy().tobytes())
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _artifact_paths(key):
+    base = os.path.join(MODEL_DIR, f'revenue-{key}')
+    return base + '.json', base + '.meta.json'
+
+
+def _forecast_path(key):
+    return os.path.join(MODEL_DIR, f'revenue-{key}.forecast.pkl')
+
+
+def train_model(daily_revenue, params=None):
+    from xgboost import XGBRegressor
+
+    params = MODEL_PARAMS if params is None else params
+    model = XGBRegressor(**params)
+    X_train = daily_revenue[features]
+    y_train = daily_revenue[target]
+    model.fit(X_train, y_train, eval_set=[(X_train, y_train)], verbose=False)
+    return model
+
+
+def train_direct_model(daily_revenue, horizon, params=None):
+    """
+    Fits the direct multi-horizon model for the next horizon days (build_direct_training_set)
+    and stores it under its model_key. Returns (model, key).
+    """
+    from xgboost import XGBRegressor
+
+    params = MODEL_PARAMS if params is None else params
+    print(f"Training the direct revenue forecast model ({horizon} days)...")
+    X_train, y_train = build_direct_training_set(daily_revenue, horizon)
+    model = XGBRegressor(**params)
+    model.fit(X_train, y_train, eval_set=[(X_train, y_train)], verbose=False)
+
+    key = model_key(daily_revenue, params, mode='direct', horizon=horizon)
+    try:
+        save_model(model, key, daily_revenue, params, mode='direct', horizon=horizon)
+    except OSError as e:
+        print(f"Could not save the forecast model: {e}")
+    return model, key
 
-X_train = daily_revenue[features]
-y_train = daily_revenue[target]
-
-# Train the model
-model = XGBRegressor(
-    n_estimators=1000,
-    learning_rate=0.05,
-    max_depth=5,
-    subsample=0.8,
-    colsample_bytree=0.8,
-    random_state=42,
-    early_stopping_rounds=50,
-    verbosity=0
-)
-model.fit(X_train, y_train, eval_set=[(X_train, y_train)], verbose=False)
-
-# Forecast horizon
-fh = 365
-
-# Prepare dataframe to hold future predictions
-last_date = daily_revenue['OrderDate'].iloc[-1]
-future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=fh)
-
-# Create a dataframe for future dates
-future_df = pd.DataFrame({'OrderDate': future_dates})
-future_df = create_features(future_df)
-
-# Initialize lag columns for future_df to zero
-for lag in range(1, 8):
-    future_df[f'lag_{lag}'] = 0.0
-
-# Combine historical + future to help fill lagged values during iteration
-full_df = pd.concat([daily_revenue[['OrderDate', 'TotalOrderAmount']], future_df[['OrderDate']]], ignore_index=True)
-full_df['TotalOrderAmount'] = pd.concat([daily_revenue['TotalOrderAmount'], pd.Series([np.nan]*fh)], ignore_index=True)
-
-# Iterative forecasting for each future day
-for i in range(fh):
-    current_date = future_dates[i]
-    
-    # Fill lag features for current date from full_df
-    for lag in range(1, 8):
-        lag_date = current_date - pd.Timedelta(days=lag)
-        # If lag_date is in full_df, get its TotalOrderAmount; else 0
-        if lag_date in full_df['OrderDate'].values:
-            lag_value = full_df.loc[full_df['OrderDate'] == lag_date, 'TotalOrderAmount'].values[0]
-            if np.isnan(lag_value):
-                lag_value = 0
+
+def warm_start_model(model, daily_revenue, params=None):
+    """
+    Adds UPDATE_ROUNDS boosting rounds to model, fitted on the whole (extended) daily revenue.
+    """
+    from xgboost import XGBRegressor
+
+    params = MODEL_PARAMS if params is None else params
+    booster = model.get_booster()
+    best_iteration = getattr(model, 'best_iteration', None)
+    rounds = booster.num_boosted_rounds() if best_iteration is None else best_iteration + 1
+    # slicing drops best_iteration, which would otherwise hide the new trees from predict
+    base = booster[:rounds]
+
+    warm_params = {k: v for k, v in params.items() if k != 'early_stopping_rounds'}
+    warm_params['n_estimators'] = UPDATE_ROUNDS
+    updated = XGBRegressor(**warm_params)
+    updated.fit(daily_revenue[features], daily_revenue[target], xgb_model=base, verbose=False)
+    return updated
+
+
+def update_model(model, meta, daily_revenue, params=None):
+    """
+    Brings a model stored for the first meta['rows'] days up to date with the days after them.
+    Returns (model, mode):
+    - 'kept': the model already predicts the new days within REFRESH_TOLERANCE and is reused as is
+    - 'warm': boosting continues on the extended data (warm_start_model)
+    - 'refit': the error on the new days is past DRIFT_THRESHOLD, or more than MAX_WARM_DAYS days
+      were added since the last full fit, so the model is trained from scratch
+    Errors are mean absolute errors relative to the mean daily revenue.
+    """
+    params = MODEL_PARAMS if params is None else params
+    start = meta['rows']
+    new_days = daily_revenue.iloc[start:]
+    scale = daily_revenue[target].iloc[:start].abs().mean()
+    error = np.abs(model.predict(new_days[features]) - new_days[target].to_numpy()).mean()
+    drift = error / scale if scale > 0 else np.inf
+
+    if drift > DRIFT_THRESHOLD or len(daily_revenue) - meta.get('refit_rows', start) > MAX_WARM_DAYS:
+        print(f"Retraining the revenue forecast model ({len(new_days)} new days, drift {drift:.2f})...")
+        return train_model(daily_revenue, params), 'refit'
+    if drift <= REFRESH_TOLERANCE:
+        return model, 'kept'
+    print(f"Updating the revenue forecast model with {len(new_days)} new days (drift {drift:.2f})...")
+    return warm_start_model(model, daily_revenue, params), 'warm'
+
+
+def save_model(model, key, daily_revenue, params, refit_rows=None, mode='recursive', horizon=None):
+    """
+    Stores model under key. refit_rows is the number of days of its last full fit
+    (all of daily_revenue by default); a direct model also records its horizon.
+    """
+    model_path, meta_path = _artifact_paths(key)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    tmp_path = model_path + f'.{os.getpid()}.tmp.json'
+    model.save_model(tmp_path)
+    os.replace(tmp_path, model_path)
+    meta = {
+        'key': key,
+        'mode': mode,
+        'horizon': horizon,
+        'features': direct_features if mode == 'direct' else features,
+        'target': target,
+        'params': params,
+        'rows': len(daily_revenue),
+        'refit_rows': len(daily_revenue) if refit_rows is None else refit_rows,
+        'first_date': str(daily_revenue['OrderDate'].iloc[0].date()),
+        'last_date': str(daily_revenue['OrderDate'].iloc[-1].date()),
+        'trained_at': time.time(),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+
+
+def prune_artifacts(keep=None):
+    """
+    Removes the stored models and forecasts not used for MAX_MODEL_AGE_DAYS, and the least
+    recently used ones past MAX_STORED_MODELS, so switching between data versions or
+    configurations reuses their models. The artifacts of keep (the key in use) stay.
+    """
+    if not os.path.isdir(MODEL_DIR):
+        return
+    paths, last_used = {}, {}
+    for name in os.listdir(MODEL_DIR):
+        if not name.startswith('revenue-'):
+            continue
+        key = name[len('revenue-'):].split('.', 1)[0]
+        path = os.path.join(MODEL_DIR, name)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        paths.setdefault(key, []).append(path)
+        last_used[key] = max(last_used.get(key, 0), mtime)
+
+    cutoff = time.time() - MAX_MODEL_AGE_DAYS * 86400
+    others = sorted((key for key in last_used if key != keep), key=last_used.get, reverse=True)
+    slots = MAX_STORED_MODELS - (keep in last_used)
+    for rank, key in enumerate(others):
+        if rank < slots and last_used[key] >= cutoff:
+            continue
+        for path in paths[key]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def load_model(key, expected_features=None):
+    """
+    Returns (model, metadata) stored under key, or None if there is no usable artifact.
+    expected_features: the feature columns the model must use, `features` by default.
+    """
+    expected_features = features if expected_features is None else expected_features
+    model_path, meta_path = _artifact_paths(key)
+    if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        from xgboost import XGBRegressor
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['features'] != expected_features:
+            return None
+        model = XGBRegressor()
+        model.load_model(model_path)
+    except Exception as e:
+        print(f"Could not load the stored forecast model {model_path}, retraining: {e}")
+        return None
+    try:
+        os.utime(meta_path)  # last use, for prune_artifacts
+    except OSError:
+        pass
+    return model, meta
+
+
+def find_previous_model(daily_revenue, params):
+    """
+    Returns (model, metadata) of the stored model trained on the most first days of daily_revenue
+    with the same params, or None. Days that changed after the fact (e.g. late orders) rule a model out.
+    """
+    if not os.path.isdir(MODEL_DIR):
+        return None
+    candidates = []
+    for name in os.listdir(MODEL_DIR):
+        if not (name.startswith('revenue-') and name.endswith('.meta.json')):
+            continue
+        try:
+            with open(os.path.join(MODEL_DIR, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        rows = meta.get('rows', 0)
+        if meta.get('mode', 'recursive') != 'recursive':
+            continue
+        if meta.get('params') != params or not 0 < rows < len(daily_revenue):
+            continue
+        candidates.append(meta)
+
+    for meta in sorted(candidates, key=lambda m: m['rows'], reverse=True):
+        if model_key(daily_revenue.iloc[:meta['rows']], params) != meta.get('key'):
+            continue
+        stored = load_model(meta['key'])
+        if stored is not None:
+            return stored
+    return None
+
+
+def save_forecast(key, future_df):
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    tmp_path = _forecast_path(key) + f'.{os.getpid()}.tmp'
+    future_df.to_pickle(tmp_path)
+    os.replace(tmp_path, _forecast_path(key))
+
+
+def load_forecast(key, fh=None):
+    """
+    Returns the forecast stored under key (its first fh days), or None if there is none or it is shorter.
+    """
+    try:
+        future_df = pd.read_pickle(_forecast_path(key))
+    except Exception:
+        return None
+    if fh is not None:
+        if len(future_df) < fh:
+            return None
+        future_df = future_df.iloc[:fh]
+    return future_df
+
+
+def _resolve_model(daily_revenue, params, key, retrain):
+    """
+    Returns (model, mode, previous_key) and saves new or updated models under key.
+    mode is 'stored' when the model for key was reloaded, 'trained' for a fresh model and
+    one of the update_model modes when a model stored for fewer days (previous_key) was updated.
+    """
+    previous = None
+    if not retrain:
+        stored = load_model(key)
+        if stored is not None:
+            return stored[0], 'stored', None
+        previous = find_previous_model(daily_revenue, params)
+
+    if previous is not None:
+        old_model, meta = previous
+        model, mode = update_model(old_model, meta, daily_revenue, params)
+        refit_rows = None if mode == 'refit' else meta.get('refit_rows', meta['rows'])
+        previous_key = meta['key']
+    else:
+        print("Training the revenue forecast model...")
+        model, mode, refit_rows, previous_key = train_model(daily_revenue, params), 'trained', None, None
+
+    try:
+        save_model(model, key, daily_revenue, params, refit_rows)
+    except OSError as e:
+        print(f"Could not save the forecast model: {e}")
+    return model, mode, previous_key
+
+
+def get_model(daily_revenue=None, params=None, retrain=False):
+    """
+    Returns (model, daily_revenue), reusing the stored model when the data and params are unchanged
+    and updating it (update_model) when only new days were added.
+    """
+    if daily_revenue is None:
+        daily_revenue = load_daily_revenue()
+    params = MODEL_PARAMS if params is None else params
+    key = model_key(daily_revenue, params)
+    model, _, _ = _resolve_model(daily_revenue, params, key, retrain)
+    prune_artifacts(keep=key)
+    return model, daily_revenue
+
+
+def _get_direct_forecast(fh, daily_revenue, params, retrain):
+    key = model_key(daily_revenue, params, mode='direct', horizon=fh)
+    stored = None if retrain else load_model(key, direct_features)
+    if stored is not None:
+        future_df = load_forecast(key, fh)
+        if future_df is not None:
+            return future_df, key
+        model = stored[0]
+    else:
+        model, key = train_direct_model(daily_revenue, fh, params)
+
+    future_df = direct_forecast(model, daily_revenue, fh)
+    try:
+        save_forecast(key, future_df)
+    except OSError as e:
+        print(f"Could not save the forecast: {e}")
+    return future_df, key
+
+
+def get_forecast(fh=365, daily_revenue=None, params=None, retrain=False, mode='recursive'):
+    """
+    Returns (future_df, daily_revenue) with the forecast of the next fh days.
+
+    mode 'recursive' (the default) forecasts one day at a time with the model of get_model.
+    The forecast is stored next to the model: unchanged data reloads it, and when new days were
+    added but the stored model was kept, it is rolled forward with roll_forecast instead of
+    forecast again. An updated or retrained model forecasts all fh days.
+
+    mode 'direct' predicts all fh days at once with a model trained for that horizon
+    (train_direct_model). It is stored and reloaded the same way, but retrained when days are added.
+    """
+    if mode not in FORECAST_MODES:
+        raise ValueError(f"Unknown forecast mode: {mode}")
+    if daily_revenue is None:
+        daily_revenue = load_daily_revenue()
+    params = MODEL_PARAMS if params is None else params
+    if mode == 'direct':
+        future_df, key = _get_direct_forecast(fh, daily_revenue, params, retrain)
+        prune_artifacts(keep=key)
+        return future_df, daily_revenue
+
+    key = model_key(daily_revenue, params)
+    model, mode, previous_key = _resolve_model(daily_revenue, params, key, retrain)
+
+    future_df = load_forecast(key, fh) if mode == 'stored' else None
+    if future_df is None:
+        previous_df = load_forecast(previous_key) if mode == 'kept' else None
+        if previous_df is not None:
+            future_df = roll_forecast(model, previous_df, daily_revenue, fh)
         else:
-            lag_value = 0
-        future_df.loc[future_df['OrderDate'] == current_date, f'lag_{lag}'] = lag_value
-
-    # Extract features for prediction
-    X_pred = future_df[future_df['OrderDate'] == current_date][features]
-    pred = model.predict(X_pred)[0]
-    
-    # Store prediction in future_df and full_df
-    future_df.loc[future_df['OrderDate'] == current_date, 'TotalOrderAmount'] = pred
-    full_df.loc[full_df['OrderDate'] == current_date, 'TotalOrderAmount'] = pred
-
-# 3rd line: forecast of revenues with bundling
-extra_daily_rev = get_average_added_profit()
-
-print(f"Average added profit per day from bundling: {extra_daily_rev}")
-
-# Add the extra daily revenue from bundling to the forecast
-future_bundled_df = future_df.copy()
-future_bundled_df['TotalOrderAmount'] += extra_daily_rev
-
-# Plot the historical + forecast
-plt.figure(figsize=(12,6))
-plt.plot(daily_revenue['OrderDate'], daily_revenue['TotalOrderAmount'], label='Historical Daily Revenue')
-plt.plot(future_df['OrderDate'], future_df['TotalOrderAmount'], label=f'Forecast Next {fh} Days', linestyle='--', marker='')
-plt.plot(future_bundled_df['OrderDate'], future_bundled_df['TotalOrderAmount'], label=f'Bundled Forecast Next {fh} Days', linestyle='--', marker='')
-plt.title(f'Daily Revenue and {fh}-Day Forecast (XGBoost)')
-plt.xlabel('Date')
-plt.ylabel('Revenue')
-plt.legend()
-plt.grid(True)
-plt.tight_layout()
-plt.show()
+            future_df = recursive_forecast(model, daily_revenue, fh)
+        try:
+            save_forecast(key, future_df)
+        except OSError as e:
+            print(f"Could not save the forecast: {e}")
+
+    prune_artifacts(keep=key)
+    return future_df, daily_revenue
+
+
+def main(fh=365, mode='recursive'):
+    import matplotlib.pyplot as plt
+    from suggest_bundles import get_average_added_profit
+
+    future_df, daily_revenue = get_forecast(fh, mode=mode)
+
+    # 3rd line: forecast of revenues with bundling
+    extra_daily_rev = get_average_added_profit()
+
+    print(f"Average added profit per day from bundling: {extra_daily_rev}")
+
+    # Add the extra daily revenue from bundling to the forecast
+    future_bundled_df = future_df.copy()
+    future_bundled_df['TotalOrderAmount'] += extra_daily_rev
+
+    # Plot the historical + forecast
+    plt.figure(figsize=(12,6))
+    plt.plot(daily_revenue['OrderDate'], daily_revenue['TotalOrderAmount'], label='Historical Daily Revenue')
+    plt.plot(future_df['OrderDate'], future_df['TotalOrderAmount'], label=f'Forecast Next {fh} Days', linestyle='--', marker='')
+    plt.plot(future_bundled_df['OrderDate'], future_bundled_df['TotalOrderAmount'], label=f'Bundled Forecast Next {fh} Days', linestyle='--', marker='')
+    plt.title(f'Daily Revenue and {fh}-Day Forecast (XGBoost)')
+    plt.xlabel('Date')
+    plt.ylabel('Revenue')
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.show()
+
+
+if __name__ == "__main__":
+    main(mode=sys.argv[1] if len(sys.argv) > 1 else 'recursive')
@@ -0,0 +1,83 @@
+"""
+Month bitmask of every inventory SKU and month -> SKU index for seasonal bundles.
+
+Bit m - 1 of a mask is set when month m is in the SKU's season. update_inventory.py writes
+the masks to the SeasonMask column of custom_inventory.csv, with ranges that wrap around
+the new year ("december-february" has December, January and February). For files written
+before that column existed the masks are parsed from the Seasonality text. "all year"
+SKUs have no season and a mask of 0.
+
+The old update_inventory.py wrote every season that wraps around the new year as
+"january-december", which does not say which months it has; files without SeasonMask that
+contain it are refused, update_inventory.py has to be run again to write the masks.
+"""
+import numpy as np
+
+import data_store
+
+MONTH_NAMES = [
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december'
+]
+ALL_MONTHS = (1 << 12) - 1
+LEGACY_WRAPPED_SEASON = 'january-december'
+
+
+def month_number(name):
+    """
+    1-12 for a month name or its first three letters ('jan', 'January'), None if it is not one.
+    """
+    name = name.strip().lower()
+    for i, month in enumerate(MONTH_NAMES):
+        if len(name) >= 3 and month.startswith(name):
+            return i + 1
+    return None
+
+
+def mask_from_seasonality(seasonality):
+    """
+    Mask of a Seasonality value: 'march', 'apr-aug', 'december-february' or 'all year'.
+    """
+    if not isinstance(seasonality, str):
+        return 0
+    parts = [month_number(part) for part in seasonality.split('-')]
+    if not parts or len(parts) > 2 or None in parts:
+        return 0
+    start, end = parts[0], parts[-1]
+    length = (end - start) % 12 + 1
+    return sum(1 << ((start - 1 + i) % 12) for i in range(length))
+
+
+def _build_index(inventory_df):
+    if 'SeasonMask' in inventory_df.columns:
+        masks = inventory_df['SeasonMask'].fillna(0).to_numpy(dtype=np.int64)
+    else:
+        if (inventory_df['Seasonality'] == LEGACY_WRAPPED_SEASON).any():
+            raise ValueError(
+                f"custom_inventory.csv has no SeasonMask column and seasons written as '{LEGACY_WRAPPED_SEASON}', "
+                "which do not say their months; run preprocess/update_inventory.py again."
+            )
+        masks = np.array([mask_from_seasonality(s) for s in inventory_df['Seasonality']], dtype=np.int64)
+    by_month = [np.flatnonzero(masks & (1 << m)) for m in range(12)]
+    return masks, by_month
+
+
+def get_index():
+    """
+    (masks, by_month): the mask of every inventory row, and for each month (0 = January) the
+    rows in season, built once per version of custom_inventory.csv.
+    """
+    return data_store.derived('inventory', 'season_index', _build_index)
+
+
+def season_rows(season=None):
+    """
+    Inventory rows in season in the given month ('jan', 'january', ...), or with any season if None.
+    """
+    masks, by_month = get_index()
+    if season is None:
+        return np.flatnonzero(masks & ALL_MONTHS)
+    month = month_number(season)
+    if month is None:
+        raise ValueError(f"Unknown season: {season}")
+    return by_month[month - 1]
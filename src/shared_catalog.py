@@ -0,0 +1,92 @@
+"""
+The inventory and co-purchase tables in shared memory, for worker processes (parallel_bundles.py).
+
+publish() copies every column of custom_inventory.csv and bought_together.csv into a
+multiprocessing.shared_memory block and returns a small picklable handle. attach(handle)
+in a worker maps the blocks as NumPy arrays and hands the tables to data_store, so the
+bundle generators there use them instead of reading the files. Numeric columns are used
+in place; text columns are stored as fixed-width unicode arrays plus a mask of the missing
+values, and turned back into strings once per worker.
+
+A worker whose file changed after publish() reads it again, like data_store always does.
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import data_store
+
+TABLES = ['inventory', 'bought_together']
+
+_attached = []  # blocks a worker keeps open, its arrays point into them
+
+
+def _share(array, blocks):
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block.name, array.dtype.str, array.shape
+
+
+def _is_plain_numeric(dtype):
+    return isinstance(dtype, np.dtype) and (np.issubdtype(dtype, np.number) or dtype == bool)
+
+
+def publish(tables=TABLES):
+    """
+    Copies the tables into shared memory. Returns (handle, blocks): the handle goes to the
+    workers, the blocks stay with the caller until release(blocks).
+    """
+    handle, blocks = {}, []
+    try:
+        for name in tables:
+            signature, df = data_store.snapshot(name)
+            columns = []
+            for col in df.columns:
+                values = df[col]
+                if _is_plain_numeric(values.dtype):
+                    columns.append((col, str(values.dtype), _share(values.to_numpy(), blocks), None))
+                    continue
+                missing = values.isna().to_numpy()
+                text = values.astype(object).where(~missing, '').astype(str).to_numpy(dtype=str)
+                columns.append((col, str(values.dtype), _share(text, blocks), _share(missing, blocks)))
+            handle[name] = (signature, columns)
+    except BaseException:
+        release(blocks)
+        raise
+    return handle, blocks
+
+
+def release(blocks):
+    """
+    Frees the blocks of publish(); workers that still use them must be stopped first.
+    """
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+def _open(spec):
+    name, dtype, shape = spec
+    # workers share the resource tracker of the publishing process, which unlinks the block
+    block = shared_memory.SharedMemory(name=name)
+    _attached.append(block)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def attach(handle):
+    """
+    Makes the published tables the contents of their data_store sources in this process.
+    """
+    for name, (signature, columns) in handle.items():
+        data = {}
+        for col, dtype, values_spec, missing_spec in columns:
+            values = _open(values_spec)
+            if missing_spec is None:
+                data[col] = values
+                continue
+            text = values.astype(object)
+            text[_open(missing_spec)] = None
+            data[col] = pd.array(text, dtype=dtype)
+        data_store.preload(name, signature, pd.DataFrame(data, copy=False))
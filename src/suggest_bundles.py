@@ -1,156 +1,129 @@
+import numpy as np
 import pandas as pd
-from itertools import combinations
 from collections import Counter
 
+import data_store
+import bundle_eval
+import bundle_graph
+import metrics
+import parallel_bundles
+import result_cache
+import season_index
 from user_profiling import get_user_profile
 
-def load_inventory():
-    inventory_df = pd.read_csv('../data/custom_inventory.csv')
-    sku_to_name = dict(zip(inventory_df['SKU'], inventory_df['ProductName']))
-    return inventory_df, sku_to_name
-
-
 def get_top_skus_by_priority(inventory_df, priority, top_n=10):
     return inventory_df.sort_values(by='SKU').head(top_n)['SKU'].tolist() if priority == "SKU" else []
 
 
-def sku_bundle_to_name(bundle, sku_to_name):
-    return tuple(sku_to_name.get(sku, sku) for sku in bundle)
+def priority_mask(inventory_df, priority, rows=None):
+    """
+    Boolean array over the inventory: every bundle must include one of its True rows,
+    the top SKUs by priority out of `rows` (all rows if None). None if any bundle goes.
+    """
+    candidates = inventory_df if rows is None else inventory_df.iloc[rows]
+    top_skus = get_top_skus_by_priority(candidates, priority)
+    if not top_skus:
+        return None
+    return inventory_df['SKU'].isin(top_skus).to_numpy()
 
 
+@metrics.timed('bundles.complementary')
 def get_bundle_complementary(priority=None, depth=5):
     """
     Reads ../data/bought_together.csv (ProductA,ProductB,Count) and returns combinations of 3 products
     (if A and B are bought together and B and C also bought together suggest bundles of the 3 products).
     Find all combinations of 3 products that are bought together, and return a list of the top [depth] combinations
-    (top is defined by Count).
+    (top is defined by Count: the sum of the three pair Counts, see bundle_graph.top_k_triangles).
 
     if priority==None: do as normal
     if priority=="SKU": then sort custom_inventory.csv by SKU and return [depth] bundles that each of them contains 3
         products as before but at least one of them must be in the top list of the sorted by SKU list.
     """
-    bt_df = pd.read_csv('../data/bought_together.csv')
-    inventory_df, sku_to_name = load_inventory()
-
-    # Build product pair graph
-    graph = {}
-    for _, row in bt_df.iterrows():
-        a, b = row['ProductA'], row['ProductB']
-        graph.setdefault(a, set()).add(b)
-        graph.setdefault(b, set()).add(a)
+    inventory_df = data_store.get_inventory()
 
-    triplets = set()
-    for a in graph:
-        for b in graph[a]:
-            for c in graph.get(b, []):
-                if c in graph[a] and len({a, b, c}) == 3:
-                    triplets.add(tuple(sorted([a, b, c])))
+    top_skus = set(get_top_skus_by_priority(inventory_df, priority))
+    keep = (lambda t: any(p in top_skus for p in t)) if top_skus else None
 
-    top_skus = get_top_skus_by_priority(inventory_df, priority)
-    if top_skus:
-        triplets = [t for t in triplets if any(p in top_skus for p in t)]
+    # Each triangle is scored by the sum of its three pair Counts, best first
+    triplets = bundle_graph.top_k_triangles(depth, keep=keep)
+    metrics.count('bundles.complementary.candidates', len(triplets))
 
-    bundles = [sku_bundle_to_name(t, sku_to_name) for t in list(triplets)[:depth]]
+    rows = bundle_eval.to_index_array([t for t, _ in triplets], by='sku')
 
-    bundles = [eval_and_format(b, btype='complementary') for b in bundles]
-
-    return bundles
+    return eval_and_format_rows(rows, btype='complementary')
 
 
+@metrics.timed('bundles.seasonal')
 def get_bundle_seasonal(season=None, priority=None, depth=5):
     """
     season: 3-letter name of a month (eg 'jan')
 
-    Reads ../data/custom_inventory.csv and returns [depth] combinations of 2-3 products that Have seasonality matching the season.
-    For example if season='jan' then all products in the bundle have in their seasonality column the value "jan" or somethin that
-    conatins "jan" like "dec-feb"
-    If season = None, then returns all products that have any seasonality.
+    Returns the [depth] most profitable bundles of 3 products that are all in season in that month,
+    from the month -> SKU index (season_index.py). Seasons wrap around the new year, so 'jan' also
+    matches "december-february".
+    If season = None, then uses all products that have any seasonality.
 
     if priority==None: do as normal
-    if priority=="SKU": then sort custom_inventory.csv by SKU and return [depth] bundles that each of them contains 2-3
-        products as before but at least one of them must be in the top list of the sorted by SKU list.
+    if priority=="SKU": then sort the seasonal products by SKU and return [depth] bundles that each of them
+        contains at least one of the top of the sorted by SKU list.
     """
-    inventory_df, sku_to_name = load_inventory()
-    df = inventory_df.dropna(subset=['Seasonality'])
+    inventory_df = data_store.get_inventory()
+    rows = season_index.season_rows(season)
 
-    if season:
-        df = df[df['Seasonality'].str.contains(season, case=False)]
+    triples = bundle_eval.top_k_bundles(rows, depth, required=priority_mask(inventory_df, priority, rows))
+    metrics.count('bundles.seasonal.candidates', len(triples))
 
-    top_skus = get_top_skus_by_priority(df, priority)
-    bundles = []
-    skus = df['SKU'].tolist()
-
-    for bundle in combinations(skus, 3):
-        if not top_skus or any(sku in top_skus for sku in bundle):
-            bundl = sku_bundle_to_name(bundle, sku_to_name)
-            bundl_eval = eval_and_format(bundl, btype='seasonal')
-            bundles.append(bundl_eval)
-        if len(bundles) == depth:
-            break
-
-    return bundles
+    return format_found(triples, btype='seasonal')
 
 
+@metrics.timed('bundles.thematic')
 def get_bundle_thematic(priority=None, depth=5):
     """
-    Reads ../data/custom_inventory.csv and returns [depth] combinations of 2-3 products that have the same ProductCategory.
+    Reads ../data/custom_inventory.csv and returns the [depth] most profitable bundles of 3 products that have
+    the same ProductCategory (bundle_eval.top_k_bundles).
     If priority==None: do as normal
-    If priority=="SKU": then sort custom_inventory.csv by SKU and return [depth] bundles that each of them contains 2-3
+    If priority=="SKU": then sort custom_inventory.csv by SKU and return [depth] bundles that each of them contains 3
         products as before but at least one of them must be in the top list of the sorted by SKU list.
     """
-    inventory_df, sku_to_name = load_inventory()
-    top_skus = get_top_skus_by_priority(inventory_df, priority)
+    inventory_df = data_store.get_inventory()
+    categories = data_store.derived(
+        'inventory', 'category_codes', lambda df: pd.factorize(df['ProductCategory'])[0]
+    )
 
-    bundles = []
-    for _, group in inventory_df.groupby('ProductCategory'):
-        skus = group['SKU'].tolist()
-        for bundle in combinations(skus, 3):
-            if not top_skus or any(sku in top_skus for sku in bundle):
-
-                bundl = sku_bundle_to_name(bundle, sku_to_name)
-                bundl_eval = eval_and_format(bundl, btype='thematic')
-                bundles.append(bundl_eval)
-            if len(bundles) == depth:
-                return bundles
-    return bundles
+    # products without a category are not in any theme
+    rows = np.flatnonzero(categories >= 0)
+    triples = bundle_eval.top_k_bundles(rows, depth, groups=categories, required=priority_mask(inventory_df, priority))
+    metrics.count('bundles.thematic.candidates', len(triples))
+
+    return format_found(triples, btype='thematic')
 
 
+@metrics.timed('bundles.cross_sell')
 def get_bundle_cross_sell(priority=None, depth=5):
     """
     Reads ../data/custom_inventory.csv (SKU,Quantity,ProductCategory,ProductName,Margin
         AverageDiscount,OrderCount_Ratio_Discounted_vs_FullPrice,Seasonality)
-        and returns [depth] combinations of 2 products. The 2 products must be one with low profit margin and one with high.
+        and returns the [depth] most profitable bundles of 2 products (bundle_eval.top_k_pairs).
+        The 2 products must be one with low profit margin (lower half) and one with high (upper half);
+        the cheaper one comes first.
 
     if priority==None: do as normal
-    if priority=="SKU": then sort custom_inventory.csv by SKU and return [depth] bundles that each of them contains 3
+    if priority=="SKU": then sort custom_inventory.csv by SKU and return [depth] bundles that each of them contains 2
         products as before but at least one of them must be in the top list of the sorted by SKU list.
     """
-    inventory_df, sku_to_name = load_inventory()
-    sorted_df = inventory_df.sort_values(by='Margin')
-    low_margin = sorted_df.head(len(sorted_df)//2)['SKU'].tolist()
-    high_margin = sorted_df.tail(len(sorted_df)//2)['SKU'].tolist()
+    inventory_df = data_store.get_inventory()
+    by_margin = np.argsort(inventory_df['Margin'].to_numpy(), kind='stable')
+    # with an odd number of products the middle one is in neither half
+    half = len(by_margin) // 2
+    low_margin, high_margin = by_margin[:half], by_margin[len(by_margin) - half:]
 
-    top_skus = get_top_skus_by_priority(inventory_df, priority)
+    pairs = bundle_eval.top_k_pairs(low_margin, high_margin, depth, required=priority_mask(inventory_df, priority))
+    metrics.count('bundles.cross_sell.candidates', len(pairs))
 
-    bundles = []
-    for low in low_margin:
-        for high in high_margin:
-            if low != high:
-                if not top_skus or low in top_skus or high in top_skus:
-                    bundles.append(sku_bundle_to_name((low, high), sku_to_name))
-                if len(bundles) == depth:
-
-                    eval_bundles = []
-                    for b in bundles:
-                        eval_bundles.append(eval_and_format(b, btype='cross_sell'))
-                    return eval_bundles
-
-    eval_bundles = []
-    for b in bundles:
-        eval_bundles.append(eval_and_format(b, btype='cross_sell'))
-    return eval_bundles
+    return format_found(pairs, btype='cross_sell')
 
 
+@metrics.timed('bundles.personal_frequent')
 def get_bundle_personal_frequently_bought(user_profile, priority=None):
     """
     Gets profile data from userid and finds the two most bought products by the user.
@@ -158,8 +131,7 @@ def get_bundle_personal_frequently_bought(user_profile, priority=None):
     If priority==None: do as normal, 3rd product is a low margin
     if priority=="SKU": then sort custom_inventory.csv by SKU and 3rd product is the top from the list.
     """
-    orders = pd.read_csv('../data/custom_orders.csv')
-    inventory_df, sku_to_name = load_inventory()
+    inventory_df = data_store.get_inventory()
 
     user_orders = user_profile['MostFrequentProducts']
 
@@ -187,12 +159,12 @@ def get_bundle_personal_frequently_bought(user_profile, priority=None):
     else:
         third_product = inventory_df.sort_values(by='Margin').iloc[0]['SKU']
 
-    ret  = [sku_bundle_to_name((top_skus[0], top_skus[1], third_product), sku_to_name)]
-    ret = eval_and_format(ret, btype='personal_frequent')
+    rows = bundle_eval.to_index_array([(top_skus[0], top_skus[1], third_product)], by='sku')
 
-    return [ret]
+    return eval_and_format_rows(rows, btype='personal_frequent')
 
 
+@metrics.timed('bundles.personal_seasonal')
 def get_bundle_personal_seasonal(user_profile, priority=None):
     """
     Gets profile data from userid and finds the seasonality of the user - if exists.
@@ -204,8 +176,7 @@ def get_bundle_personal_seasonal(user_profile, priority=None):
     if priority=="SKU": then sort custom_inventory.csv by SKU and 2nd product is the top from the list.
     """
     # Load data
-    inventory_df = pd.read_csv('../data/custom_inventory.csv')
-    orders = pd.read_csv('../data/custom_orders.csv')
+    inventory_df = data_store.get_inventory()
 
     user_id = user_profile.get("UserID")
     user_seasonality = user_profile.get('SeasonalTrend')
@@ -248,84 +219,39 @@ def get_bundle_personal_seasonal(user_profile, priority=None):
 
 
 
+@metrics.timed('bundles.personal_discount')
 def get_bundle_personalized_discounts(user_profile):
     """
     Gets profile data from userid, and from there if discount_preference > 0.6 then
     sort products in custom_inventory.csv by SKU and create one bundle of the top 3 products,
     and one bundle of the top 2 producs. Return the 2 bundles.
     """
-    inventory_df, sku_to_name = load_inventory()
+    inventory_df = data_store.get_inventory()
 
     bundles = []
 
     if user_profile['DiscountPreference'] > 0.6:
         sorted_skus = inventory_df.sort_values(by='SKU')['SKU'].tolist()
-        bundles.append(sku_bundle_to_name(tuple(sorted_skus[:3]), sku_to_name))
-        bundles.append(sku_bundle_to_name(tuple(sorted_skus[:2]), sku_to_name))
+        bundles.append(tuple(sorted_skus[:3]))
+        bundles.append(tuple(sorted_skus[:2]))
 
-    bundles = [eval_and_format(b, btype='personal_discount') for b in bundles]
-
-    return bundles
+    return eval_and_format_rows(bundle_eval.to_index_array(bundles, by='sku'), btype='personal_discount')
 
+@metrics.timed('bundles.evaluate')
 def evaluate_bundle(bundle, cheapness=0.5):
 
-    inventory_df = pd.read_csv('../data/custom_inventory.csv')
-
     """
     cheapness: 0 means zero discount, 1 means maximum discount (leaves only 10% profit margin for us)
-    """
-
-    # Create lookup by product name
-    name_to_row = {row['ProductName']: row for _, row in inventory_df.iterrows()}
-
-    conversion_rate = 0.1 # rate at which we expect to sell the bundle
-
-    products = []
-
-    #print(f"Evaluating bundle:")
-    #for product in bundle:
-    #    print(f"\t- {product}")
-
-    for product in bundle:
-        product_name = product if isinstance(product, str) else product[0]
-
-        if product_name not in name_to_row:
-            raise ValueError(f"Product '{product_name}' not found in inventory.")
-
-        row = name_to_row[product_name]
-
-        ratio = row['OrderCount_Ratio_Discounted_vs_FullPrice']
-        if ratio == float('inf'):
-            ratio = 9999999
-
-        products.append({
-            "price": row['BasePrice'],
-            "avg_discount_percent": row['AverageDiscount']/100,
-            "discount_pref_ratio": ratio,
-            "margin": row['Margin']/100
-        })
-
-    if len(products) < 2 or len(products) > 3:
-        raise ValueError("Bundles must contain exactly 2 or 3 products.")
-
-    # You need to define this elsewhere
-    first_product_price, total_price, max_discount = calculate_bundle_discount_flexible_percent(products)
-
-    #print(f"\tBundle evaluation: First product price = ${first_product_price:.2f}")
-    #print(f"\tTotal price of bundle = ${total_price}")
-    #print(f"\tMaximum discount = {max_discount}")
-
-    new_price_total = total_price * (1 - cheapness * max_discount)
-
-    added_profit = new_price_total - first_product_price
 
-    added_profit *= conversion_rate  # Adjust profit by conversion rate
-
-    #print(f"\tNew total price after discount = ${new_price_total:.2f}")
-    #print(f"\tBundle profit evaluation: First product price = ${first_product_price:.2f}")
-    #print(f"\tExpected profit gain = ${added_profit:.2f}")
+    Single-bundle wrapper around bundle_eval.evaluate_bundles. Products are SKUs, or product
+    names that belong to a single SKU.
+    """
+    products = [product if isinstance(product, str) else product[0] for product in bundle]
+    idx = bundle_eval.to_index_array([products], by='any')
+    added_profit = bundle_eval.evaluate_bundles(idx, cheapness)['added_profit'][0]
+    metrics.count('bundles.evaluated')
 
-    return added_profit
+    return float(added_profit)
 
 def calculate_bundle_discount_flexible_percent(products):
     """
@@ -350,6 +276,7 @@ def calculate_bundle_discount_flexible_percent(products):
     return first_product_price, total_price, max_discount
 
 
+@metrics.timed('bundles.personalized')
 def get_all_personalized_bundles(userId=None, priority=None):
     """
     returns list of objects containing list of bundles, added profit and bundle type
@@ -387,6 +314,73 @@ def eval_and_format(bundle, cheapness=0.5, btype="unset"):
     return {'bundle': bundle, 'added_profit': added_profit, 'bundle_type': btype}
 
 
+def eval_and_format_batch(bundles, cheapness=0.5, btype="unset"):
+    """
+    Same as eval_and_format for a list of bundles (SKUs or unique product names), evaluated
+    in one vectorized pass.
+    """
+    if not bundles:
+        return []
+    products = [[p if isinstance(p, str) else p[0] for p in b] for b in bundles]
+    idx = bundle_eval.to_index_array(products, by='any')
+    return [
+        {**result, 'bundle': b} for b, result in zip(bundles, eval_and_format_rows(idx, cheapness, btype))
+    ]
+
+
+def format_found(found, btype="unset"):
+    """
+    Formats the (bundle rows, added profit) list of bundle_eval.top_k_bundles / top_k_pairs
+    like eval_and_format_rows, keeping the profit the search ranked the bundles by.
+    """
+    idx = np.full((len(found), 3), bundle_eval.PAD, dtype=np.int64)
+    for i, (rows, _) in enumerate(found):
+        idx[i, :len(rows)] = rows
+    return [
+        {'bundle': b, 'added_profit': float(p), 'bundle_type': btype}
+        for b, (_, p) in zip(bundle_eval.bundle_names(idx), found)
+    ]
+
+
+def eval_and_format_rows(idx, cheapness=0.5, btype="unset"):
+    """
+    Same as eval_and_format_batch for an (N, 3) array of inventory rows (see bundle_eval).
+    The products are identified by their rows; the returned bundles hold their names, for display.
+    """
+    if not len(idx):
+        return []
+    with metrics.span('bundles.evaluate_batch'):
+        profits = bundle_eval.evaluate_bundles(idx, cheapness)['added_profit']
+    metrics.count('bundles.evaluated', len(idx))
+    return [
+        {'bundle': b, 'added_profit': float(p), 'bundle_type': btype}
+        for b, p in zip(bundle_eval.bundle_names(idx), profits)
+    ]
+
+
+def optimize_and_format_batch(bundles, btype="unset", cheapness_grid=None, elasticity=None):
+    """
+    Like eval_and_format_batch, but picks the most profitable cheapness for every bundle
+    (see bundle_eval.optimize_cheapness). Adds 'cheapness' and 'discount' to each result.
+    """
+    if not bundles:
+        return []
+    products = [[p if isinstance(p, str) else p[0] for p in b] for b in bundles]
+    idx = bundle_eval.to_index_array(products, by='any')
+    kwargs = {}
+    if cheapness_grid is not None:
+        kwargs['cheapness_grid'] = cheapness_grid
+    if elasticity is not None:
+        kwargs['elasticity'] = elasticity
+    with metrics.span('bundles.optimize_cheapness'):
+        opt = bundle_eval.optimize_cheapness(idx, **kwargs)
+    metrics.count('bundles.evaluated', len(bundles))
+    return [
+        {'bundle': b, 'added_profit': float(p), 'bundle_type': btype, 'cheapness': float(c), 'discount': float(d)}
+        for b, p, c, d in zip(bundles, opt['best_profit'], opt['best_cheapness'], opt['best_discount'])
+    ]
+
+
 def print_bundles(bundles):
     """
     Print the bundles with their added profit and type.
@@ -404,13 +398,40 @@ def print_bundles(bundles):
 def sort_bundles(bundles):
     return sorted(bundles, key=lambda x: x['added_profit'], reverse=True)
 
+def _season_key(season):
+    month = season_index.month_number(season) if isinstance(season, str) else None
+    return month if month is not None else season
+
+
+def _user_key(user_id):
+    # the order lookup compares ids by value, so 11107 and '11107' are different users
+    return None if user_id is None else (type(user_id).__name__, user_id)
+
+
+def bundle_query(type, depth=3, userID=None, priority=None, season=None):
+    """
+    Cache key of a get_bundles query, with only the arguments that bundle type uses.
+    """
+    priority = priority or None
+    if type == "personalized":
+        return (type, _user_key(userID), priority)
+    if type == "seasonal":
+        return (type, depth, priority, _season_key(season))
+    return (type, depth, priority)
+
+
 def get_bundles(type="thematic", depth=3, userID=None, priority=None, season="jan"):
     """
     type = {complementary, seasonal, thematic, cross-sell, personalized}
 
-    results are already evaluated and formatted
+    results are already evaluated and formatted; repeated queries are answered from
+    result_cache.py until the data changes, so treat them as read-only
     """
+    query = bundle_query(type, depth, userID, priority, season)
+    return result_cache.cached(query, lambda: _generate_bundles(type, depth, userID, priority, season))
+
 
+def _generate_bundles(type, depth, userID, priority, season):
     print(f"Fetching bundles of type: {type} with priority: {priority} and depth: {depth}, season: {season}, userID: {userID}...")
 
     if type == "complementary":
@@ -427,20 +448,35 @@ def get_bundles(type="thematic", depth=3, userID=None, priority=None, season="ja
         raise ValueError(f"Unknown bundle type: {type}")
 
 
-def get_all_bundles(userId=None, priority=None, depth=3, season=None):
+def get_all_bundles(userId=None, priority=None, depth=3, season=None, workers=None):
+    """
+    Bundles of every type, best first, and the average total added profit per day
+    (cached like get_bundles).
 
-    bundles = []
+    workers: generate the bundle types at the same time in that many processes
+        (parallel_bundles.py), default BUNDLE_WORKERS; 0 or 1 runs them one after the other.
+    """
+    query = ("all", _user_key(userId), priority or None, depth, _season_key(season))
+    return result_cache.cached(query, lambda: _generate_all_bundles(userId, priority, depth, season, workers))
+
+
+@metrics.timed('bundles.all')
+def _generate_all_bundles(userId, priority, depth, season, workers=None):
+
+    queries = [
+        dict(type="complementary", depth=depth, priority=priority),
+        dict(type="seasonal", depth=depth, priority=priority, season=season),
+        dict(type="thematic", depth=depth, priority=priority),
+        dict(type="cross-sell", depth=depth, priority=priority),
+        dict(type="personalized", userID=userId, priority=priority),
+    ]
+    workers = parallel_bundles.default_workers() if workers is None else workers
+    if workers > 1:
+        results = parallel_bundles.generate(queries, workers)
+    else:
+        results = [get_bundles(**query) for query in queries]
 
-    bs = get_bundles(type="complementary", depth=depth, priority=priority)
-    bundles.extend(bs)
-    bs = get_bundles(type="seasonal", depth=depth, priority=priority, season=season)
-    bundles.extend(bs)
-    bs = get_bundles(type="thematic", depth=depth, priority=priority)
-    bundles.extend(bs)
-    bs = get_bundles(type="cross-sell", depth=depth, priority=priority)
-    bundles.extend(bs)
-    bs = get_bundles(type="personalized", userID=userId, priority=priority)
-    bundles.extend(bs)
+    bundles = [bundle for result in results for bundle in result]
 
     # sort
     bundles = sort_bundles(bundles)
@@ -454,11 +490,9 @@ def get_all_bundles(userId=None, priority=None, depth=3, season=None):
     print(f"\nAverage added profit (including conversion rate): ${avg_added_profit:.2f} per bundle")
 
     # average number of orders per day
-    orders = pd.read_csv('../data/custom_orders.csv', parse_dates=['CreatedDate'])
-    orders['OrderDate'] = orders['CreatedDate'].dt.date
-    daily_orders = orders.drop_duplicates(subset=['OrderNumber', 'OrderDate'])
-    orders_per_day = daily_orders.groupby('OrderDate')['OrderNumber'].count()
-    average_orders_per_day = orders_per_day.mean()
+    with metrics.span('bundles.orders_per_day'):
+        daily_orders = data_store.get_daily_orders()
+        average_orders_per_day = daily_orders.loc[daily_orders['Orders'] > 0, 'Orders'].mean()
     print(f"Average number of orders per day: {average_orders_per_day:.2f}")
 
 
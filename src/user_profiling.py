@@ -1,22 +1,42 @@
-import os
+import sys
 import json
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-# Load environment variables from .env
-load_dotenv()
-
-# Gemini setup
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL = os.getenv("GEMINI_MODEL")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-# Load orders.csv globally
-orders_df = pd.read_csv('../data/orders.csv', parse_dates=['CreatedDate'])
-orders_df = orders_df.dropna(subset=['UserID'])
+import data_store
+import gemini_cache
+import gemini_batch
+import gemini_client
+import metrics
+from gemini_client import GEMINI_MODEL
+
+# Orders are loaded on first use through data_store (get_user_orders / get_all_user_profiles)
+
+
+def _build_user_index(df):
+    """
+    Orders sorted by UserID (stable, so each user's rows keep their file order), the sorted
+    distinct user ids and the offset of each user's first row. User i owns rows
+    offsets[i]:offsets[i+1].
+    """
+    df = df.dropna(subset=['UserID']).sort_values('UserID', kind='stable')
+    user_ids, starts = np.unique(df['UserID'].to_numpy(), return_index=True)
+    offsets = np.append(starts, len(df))
+    return df, user_ids, offsets
+
+
+def get_user_orders(userid):
+    """
+    All order rows of one user as a contiguous slice of the user index (binary search, no full scan).
+    """
+    df, user_ids, offsets = data_store.derived('orders', 'user_index', _build_user_index)
+    if userid is None:
+        return df.iloc[0:0]
+    pos = np.searchsorted(user_ids, userid)
+    if pos == len(user_ids) or user_ids[pos] != userid:
+        return df.iloc[0:0]
+    return df.iloc[offsets[pos]:offsets[pos + 1]]
 
 # Predefined category segments
 category_segments = [
@@ -54,10 +74,15 @@ category_segments = [
 
 import re
 
-def determine_user_attributes_gemini(shopping_data_lines):
-    model = genai.GenerativeModel(GEMINI_MODEL)
+FALLBACK_USER_ATTRIBUTES = {
+    "gender": "undetermined",
+    "price_segment": "average",
+    "category_segment": ["other"]
+}
+
 
-    prompt = (
+def build_user_attributes_prompt(shopping_data_lines):
+    return (
         "You're a customer profiling AI. Based on the shopping data below, determine:\n"
         "- Gender (male, female, or undetermined) (not all items need to be male or female - just consider the majority of them)\n"
         "- Price segment (cheap, average, luxury, or undetermined)\n"
@@ -67,8 +92,17 @@ def determine_user_attributes_gemini(shopping_data_lines):
         '{\n  "gender": "...",\n  "price_segment": "...",\n  "category_segment": "..."\n}'
     )
 
+
+def request_user_attributes_gemini(prompt, timeout=None):
+    """
+    Sends the prompt to Gemini and parses the answer. Returns None if the call or the parsing fails.
+    """
+    model = gemini_client.generative_model(GEMINI_MODEL)
+    metrics.count('gemini.requests')
+
     try:
-        response = model.generate_content(prompt)
+        request_options = {"timeout": timeout} if timeout else None
+        response = model.generate_content(prompt, request_options=request_options)
         raw_text = response.text.strip()
 
         # Attempt to extract JSON block from raw text using regex
@@ -87,17 +121,45 @@ def determine_user_attributes_gemini(shopping_data_lines):
 
     except Exception as e:
         print(f"Gemini API Error: {e}\nRaw Response:\n{response.text if 'response' in locals() else 'No response'}")
-        return {
-            "gender": "undetermined",
-            "price_segment": "average",
-            "category_segment": ["other"]
-        }
+        metrics.count('gemini.failures')
+        return None
+
+
+def determine_user_attributes_gemini(shopping_data_lines):
+    """
+    Gender, price segment and category segment from the shopping history. Answers are cached
+    on disk (see gemini_cache.py), fallbacks after a failed call are not.
+    """
+    prompt = build_user_attributes_prompt(shopping_data_lines)
+
+    cached = gemini_cache.get(GEMINI_MODEL, prompt)
+    if cached is not None:
+        return cached
+
+    attributes = request_user_attributes_gemini(prompt)
+    if attributes is None:
+        return dict(FALLBACK_USER_ATTRIBUTES)
+
+    gemini_cache.put(GEMINI_MODEL, prompt, attributes)
+    return attributes
+
+
+def determine_user_attributes_batch(shopping_histories, **batch_options):
+    """
+    determine_user_attributes_gemini for many shopping histories, with concurrent, rate-limited
+    calls (see gemini_batch.run_batch for the options). Returns the attributes in the same order.
+    """
+    prompts = [build_user_attributes_prompt(lines) for lines in shopping_histories]
+    return gemini_batch.run_batch(
+        prompts, request_user_attributes_gemini, GEMINI_MODEL, FALLBACK_USER_ATTRIBUTES, **batch_options
+    )
 
 
 
 
+@metrics.timed('profile.user')
 def get_user_profile(userid):
-    user_orders = orders_df[orders_df['UserID'] == userid].copy()
+    user_orders = get_user_orders(userid).copy()
 
     print(f"Getting profile for user ID: {userid}")
 
@@ -140,7 +202,7 @@ def get_user_profile(userid):
     )
 
     sku_order_counts = sku_order_counts[sku_order_counts['TimesOrdered'] >= 2]
-    sku_order_counts = sku_order_counts.sort_values(by='TimesOrdered', ascending=False)
+    sku_order_counts = sku_order_counts.sort_values(by='TimesOrdered', ascending=False, kind='stable')
 
     sku_order_counts = sku_order_counts.merge(
         user_orders[['SKU', 'Item title']].drop_duplicates(), on='SKU', how='left'
@@ -171,7 +233,8 @@ def get_user_profile(userid):
         axis=1
     ).tolist()
 
-    user_attributes = determine_user_attributes_gemini(shopping_history_lines)
+    with metrics.span('profile.gemini'):
+        user_attributes = determine_user_attributes_gemini(shopping_history_lines)
 
     return {
         "UserID": userid,
@@ -184,13 +247,115 @@ def get_user_profile(userid):
     }
 
 
+@metrics.timed('profile.all_users')
+def get_all_user_profiles(with_attributes=False, **batch_options):
+    """
+    Profiles of every user at once, with the same fields get_user_profile returns.
+    UserAttributes (Gemini) are only added with with_attributes=True, through the concurrent
+    batch in determine_user_attributes_batch. One row per user, list/dict fields are JSON.
+    Everything else is computed with grouped operations over the whole orders table.
+    """
+    df, user_ids, _ = data_store.derived('orders', 'user_index', _build_user_index)
+    df = df.copy()
+
+    # Determine discounted vs full price items
+    df['DiscountAmount'] = (df['OriginalUnitPrice'] - df['FinalUnitPrice']).clip(lower=0)
+    df['HasDiscount'] = df['DiscountAmount'] > 0
+
+    # Discount preference
+    discounted_quantity = df['Quantity'].where(df['HasDiscount'], 0).groupby(df['UserID']).sum()
+    fullprice_quantity = df['Quantity'].where(~df['HasDiscount'], 0).groupby(df['UserID']).sum()
+    total_quantity = discounted_quantity + fullprice_quantity
+    discount_preference = (discounted_quantity / total_quantity).round(4).astype(object)
+    discount_preference[~(total_quantity > 0)] = None
+
+    # Average discount (only for discounted rows, 0.0 for users without any)
+    discounted = df[df['HasDiscount']]
+    discount_ratio = (
+        (discounted['DiscountAmount'] / discounted['OriginalUnitPrice'])
+        .replace([float('inf'), -float('inf')], np.nan)
+    )
+    average_discount = discount_ratio.groupby(discounted['UserID']).mean().round(4)
+    average_discount = average_discount.reindex(user_ids)
+    average_discount[~pd.Index(user_ids).isin(discounted['UserID'])] = 0.0
+
+    # Most frequent products by order count (ordered at least twice)
+    sku_order_counts = (
+        df.groupby(['UserID', 'SKU'])['OrderNumber']
+        .nunique()
+        .reset_index(name='TimesOrdered')
+    )
+    sku_order_counts = sku_order_counts[sku_order_counts['TimesOrdered'] >= 2]
+    sku_order_counts = sku_order_counts.sort_values(by=['UserID', 'TimesOrdered'], ascending=[True, False], kind='stable')
+    sku_order_counts = sku_order_counts.merge(
+        df[['UserID', 'SKU', 'Item title']].drop_duplicates(), on=['UserID', 'SKU'], how='left'
+    )
+    most_frequent = {
+        userid: json.dumps(group[['SKU', 'Item title', 'TimesOrdered']].to_dict(orient='records'), ensure_ascii=False, default=str)
+        for userid, group in sku_order_counts.groupby('UserID', sort=False)
+    }
+
+    # Order frequency
+    order_dates = df[['UserID', 'OrderNumber', 'CreatedDate']].drop_duplicates().sort_values(by=['UserID', 'CreatedDate'], kind='stable')
+    order_dates['DaysBetween'] = order_dates.groupby('UserID')['CreatedDate'].diff().dt.days
+    avg_days_between_orders = order_dates.groupby('UserID')['DaysBetween'].mean().reindex(user_ids)
+
+    # Seasonality: month with the most order lines, if it has at least twice the average of the user's months
+    month_counts = df.groupby(['UserID', df['CreatedDate'].dt.month.rename('Month')]).size()
+    by_user_months = month_counts.groupby(level='UserID')
+    top_month = by_user_months.idxmax().map(lambda key: key[1])
+    strong = by_user_months.max() >= 2 * by_user_months.mean()
+    seasonal_trend = pd.Series("No strong seasonal trend.", index=strong.index, dtype=object)
+    seasonal_trend[strong] = "User orders more in month " + top_month[strong].astype(str) + "."
+
+    profiles = pd.DataFrame({
+        "UserID": user_ids,
+        "MostFrequentProducts": [most_frequent.get(userid, "[]") for userid in user_ids],
+        "AverageDaysBetweenOrders": [
+            round(days, 2) if not pd.isna(days) else "Only one order" for days in avg_days_between_orders
+        ],
+        "SeasonalTrend": seasonal_trend.reindex(user_ids).to_numpy(),
+        "DiscountPreference": discount_preference.reindex(user_ids).to_numpy(),
+        "AverageDiscount": average_discount.to_numpy(),
+    })
+
+    if with_attributes:
+        # Shopping history of the top 10 SKUs of every user, as in get_user_profile
+        top_skus = sku_order_counts.groupby('UserID', sort=False).head(10)[['UserID', 'SKU']].drop_duplicates()
+        top_orders = df.merge(top_skus, on=['UserID', 'SKU'])
+        unique_rows = top_orders[['UserID', 'Category', 'Brand', 'Item title']].drop_duplicates()
+        lines = (
+            unique_rows['Category'].astype(str) + " | " + unique_rows['Brand'].astype(str)
+            + " | " + unique_rows['Item title'].astype(str)
+        )
+        histories = lines.groupby(unique_rows['UserID']).agg(list)
+        attributes = determine_user_attributes_batch(
+            [histories.get(userid, []) for userid in user_ids], **batch_options
+        )
+        profiles.insert(4, "UserAttributes", [json.dumps(a, ensure_ascii=False) for a in attributes])
+
+    return profiles
+
+
+def save_all_user_profiles(path='../data/user_profiles.csv', with_attributes=False):
+    profiles = get_all_user_profiles(with_attributes=with_attributes)
+    profiles.to_csv(path, index=False)
+    print(f"Saved {len(profiles)} user profiles to {path}")
+    return profiles
+
+
 
 
 
 # Example usage
 if __name__ == "__main__":
 
-    user_ids = orders_df['UserID'].drop_duplicates().tolist()[:3]
+    if len(sys.argv) > 1 and sys.argv[1] == '--all':
+        # Profile table for every user, add --attributes for the Gemini attributes
+        save_all_user_profiles(with_attributes='--attributes' in sys.argv)
+        sys.exit(0)
+
+    user_ids = data_store.get_orders()['UserID'].dropna().drop_duplicates().tolist()[:3]
     # 44175
     for userId in user_ids:
         profile = get_user_profile(userId)#["UserAttributes"]
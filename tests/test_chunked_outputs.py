@@ -0,0 +1,56 @@
+"""
+The preprocess scripts write the same files whether they read the orders at once or in
+chunks (ORDERS_CHUNK_SIZE), on a small data set from benchmarks/generate_data.py.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREPROCESS_DIR = os.path.join(ROOT_DIR, 'preprocess')
+CHUNK_SIZE = '777'  # does not divide the number of order lines
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    out = tmp_path_factory.mktemp('synthetic')
+    subprocess.run(
+        [sys.executable, os.path.join(ROOT_DIR, 'benchmarks', 'generate_data.py'),
+         '--lines', '5k', '--skus', '500', '--days', '30', '--out', str(out)],  # chunks split days
+        check=True, capture_output=True,
+    )
+    return out
+
+
+def run_script(dataset, script, chunk_size=None):
+    """
+    Runs a preprocess script in the data set and returns the bytes of the file it wrote.
+    """
+    env = {k: v for k, v in os.environ.items() if k != 'ORDERS_CHUNK_SIZE'}
+    if chunk_size is not None:
+        env['ORDERS_CHUNK_SIZE'] = chunk_size
+    subprocess.run(
+        [sys.executable, os.path.join(PREPROCESS_DIR, script)],
+        cwd=dataset / 'run', env=env, check=True, capture_output=True,
+    )
+
+
+def read(dataset, name):
+    return (dataset / 'data' / name).read_bytes()
+
+
+def test_categories_chunked_matches_unchunked(dataset):
+    run_script(dataset, 'get_categories.py')
+    unchunked = read(dataset, 'categories.csv')
+    run_script(dataset, 'get_categories.py', CHUNK_SIZE)
+    assert read(dataset, 'categories.csv') == unchunked
+    assert b'.0\n' not in unchunked  # integer quantities stay integers
+
+
+def test_daily_orders_chunked_matches_unchunked(dataset):
+    run_script(dataset, 'get_daily_orders.py')
+    unchunked = read(dataset, 'daily_orders.csv')
+    run_script(dataset, 'get_daily_orders.py', CHUNK_SIZE)
+    assert read(dataset, 'daily_orders.csv') == unchunked